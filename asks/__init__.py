@@ -32,12 +32,21 @@ bl_info = {
 from bpy.app.handlers import persistent
 from .config import COMPAT_OBJECTS
 from .utils import ShapeKeyReference, ASKS_UL_shape_key_references
-from .events import EventProxy, EventProxies
+from .events import EventProxy, EventProxies, event_counters_clear, event_proxies_strip, handlers_clear, log
+from .fcurves import drivers_invalidate
+from .expressions import python_drivers
 from .curves import (CurvePoint,
                      CurvePoints,
                      Curve,
+                     keyframes_cache_clear,
+                     active_curves_clear,
+                     active_curves_sync,
+                     curve_nodes_migrate,
+                     curve_nodes_release,
+                     curve_nodes_save_collect,
                      ASKS_OT_curve_point_handle_type_set,
-                     ASKS_OT_curve_point_remove
+                     ASKS_OT_curve_point_remove,
+                     ASKS_OT_curve_nodes_cleanup
                      )
 from .drivers import (WeightDriver,
                       ASKS_OT_driver_add,
@@ -51,26 +60,60 @@ from .drivers import (WeightDriver,
 from .groups import NodeGroup, NodeGroups, ASKS_OT_group_add
 from .nodes import (Node,
                     Nodes,
+                    _hierarchy_invalidate,
                     ASKS_OT_node_add,
                     ASKS_OT_interpolation_setup,
                     ASKS_PT_interpolation,
                     ASKS_PT_interpolation_popover)
 from .system import (System,
+                     rows_invalidate,
                      ASKS_OT_system_enable,
                      ASKS_PT_shape_keys_subpanel,
                      ASKS_UL_shape_keys,
                      ASKS_PT_shape_keys)
+from .profiler import reports_clear, ASKS_OT_system_profile, ASKS_PT_profile
+from .bake import ASKS_OT_system_bake, ASKS_OT_system_bake_restore, ASKS_PT_bake
 
 
 @persistent
 def _on_load(_) -> None:
     import bpy
+    _hierarchy_invalidate()
+    drivers_invalidate()
+    rows_invalidate()
+    reports_clear()
+    active_curves_clear()
     for ob in bpy.data.objects:
         if ob.type in COMPAT_OBJECTS:
             key = ob.data.shape_keys
             if key and key.is_property_set("asks") and key.asks.enabled:
+                # Curve handlers used to be bound to every curve instead of the class
+                removed = 0
+                curves = []
                 for node in key.asks.nodes:
+                    curves.append(node.curve)
+                    removed += event_proxies_strip(node.curve)
+                    driver = node.driver
+                    if driver:
+                        curves.append(driver.curve)
+                        removed += event_proxies_strip(driver.curve)
                     node.__load__()
+                if removed:
+                    log.info(f'{key.name}: removed {removed} redundant event handlers')
+                # Curves of older files each had a node, preset curves now share them
+                removed = curve_nodes_migrate(key, curves)
+                if removed:
+                    log.info(f'{key.name}: removed {removed} unshared curve nodes')
+                for fcurve in python_drivers(key):
+                    log.warning(f'{key.name}: driver {fcurve.data_path} requires the Python evaluator')
+
+
+@persistent
+def _on_undo(_) -> None:
+    _hierarchy_invalidate()
+    drivers_invalidate()
+    rows_invalidate()
+    active_curves_clear()
 
 
 CLASSES = [
@@ -90,6 +133,7 @@ CLASSES = [
     System,
     ASKS_OT_curve_point_handle_type_set,
     ASKS_OT_curve_point_remove,
+    ASKS_OT_curve_nodes_cleanup,
     ASKS_OT_system_enable,
     ASKS_OT_driver_add,
     ASKS_OT_driver_remove,
@@ -105,6 +149,11 @@ CLASSES = [
     ASKS_PT_weight_popover,
     ASKS_PT_interpolation,
     ASKS_PT_interpolation_popover,
+    ASKS_OT_system_profile,
+    ASKS_PT_profile,
+    ASKS_OT_system_bake,
+    ASKS_OT_system_bake_restore,
+    ASKS_PT_bake,
     ]
 
 preview_collections = {}
@@ -114,9 +163,10 @@ def register() -> None:
     from bpy.types import DATA_PT_shape_keys, Key
     from bpy.props import PointerProperty
     from bpy.utils import previews, register_class
-    from bpy.app.handlers import load_post
+    from bpy.app.handlers import depsgraph_update_post, load_post, redo_post, save_pre, undo_post
     from .system import _shape_keys_panel_poll_override
 
+    handlers_clear()
     for cls in CLASSES:
         register_class(cls)
 
@@ -130,19 +180,36 @@ def register() -> None:
     Key.asks = PointerProperty(type=System)
     DATA_PT_shape_keys.poll = classmethod(_shape_keys_panel_poll_override)
     load_post.append(_on_load)
+    save_pre.append(curve_nodes_save_collect)
+    undo_post.append(_on_undo)
+    redo_post.append(_on_undo)
+    depsgraph_update_post.append(active_curves_sync)
 
 
 def unregister() -> None:
     from sys import modules
     from bpy.types import DATA_PT_shape_keys, Key
     from bpy.utils import previews, unregister_class
-    from bpy.app.handlers import load_post
+    from bpy.app.handlers import depsgraph_update_post, load_post, redo_post, save_pre, undo_post
     from .system import SHAPE_KEYS_PANEL_POLL_ORIGINAL
 
     for preview in preview_collections.values():
         previews.remove(preview)
 
     load_post.remove(_on_load)
+    save_pre.remove(curve_nodes_save_collect)
+    undo_post.remove(_on_undo)
+    redo_post.remove(_on_undo)
+    depsgraph_update_post.remove(active_curves_sync)
+    _hierarchy_invalidate()
+    drivers_invalidate()
+    rows_invalidate()
+    reports_clear()
+    keyframes_cache_clear()
+    active_curves_clear()
+    curve_nodes_release()
+    handlers_clear()
+    event_counters_clear()
     DATA_PT_shape_keys.poll = SHAPE_KEYS_PANEL_POLL_ORIGINAL
     del Key.asks
     for cls in reversed(CLASSES):
@@ -0,0 +1,196 @@
+from typing import List, Set, TYPE_CHECKING
+import numpy as np
+from bpy.types import Operator, Panel
+from bpy.props import IntProperty
+from .utils import PollActiveNode, PollSystemEnabled
+from .fcurves import driver_find
+if TYPE_CHECKING:
+    from bpy.types import Action, Context, FCurve, Key, Scene
+
+# Keyframe interpolation enum value for foreach_set
+KEYFRAME_INTERPOLATION_LINEAR = 1
+
+
+def _system_drivers(key: 'Key') -> List['FCurve']:
+    result = []
+    system = key.asks
+    paths = [(f'["{group.identifier}"]', True) for group in system.groups if group.identifier]
+    for node in system.nodes:
+        if node.depth:
+            paths.append((f'key_blocks["{node.name}"].value', False))
+            paths.append((f'["{node.identifier}"]', False))
+    for path, is_array in paths:
+        if is_array:
+            index = 0
+            fcurve = driver_find(key, path, index)
+            while fcurve:
+                result.append(fcurve)
+                index += 1
+                fcurve = driver_find(key, path, index)
+        else:
+            fcurve = driver_find(key, path)
+            if fcurve:
+                result.append(fcurve)
+    return result
+
+
+def is_baked(key: 'Key') -> bool:
+    return "bake" in key.asks
+
+
+def bake(key: 'Key', scene: 'Scene', frames: range) -> 'Action':
+    import bpy
+    if is_baked(key):
+        raise RuntimeError(f'{key.name} is already baked')
+
+    blocks = key.key_blocks
+    names = [node.name for node in key.asks.nodes if node.depth and node.name in blocks]
+    indices = np.array([blocks.find(name) for name in names], dtype=int)
+
+    # Evaluate every frame once and read all shape key values in one call
+    count = len(blocks)
+    values = np.empty((len(frames), count), dtype=np.float32)
+    buffer = np.empty(count, dtype=np.float32)
+    frame = scene.frame_current
+    try:
+        for row, number in enumerate(frames):
+            scene.frame_set(number)
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+            key.evaluated_get(depsgraph).key_blocks.foreach_get("value", buffer)
+            values[row] = buffer
+    finally:
+        scene.frame_set(frame)
+
+    animdata = key.animation_data_create()
+    previous = animdata.action
+    action = bpy.data.actions.new(f'{key.name}_asks_bake')
+    action.id_root = 'KEY'
+
+    try:
+        # The record is written before anything is muted or assigned so that a
+        # partial bake can always be restored. Paths are stored as values as ID
+        # property keys are limited to 63 characters.
+        fcurves = [fcurve for fcurve in _system_drivers(key) if not fcurve.mute]
+        key.asks["bake"] = {
+            "action": previous.name if previous else "",
+            "baked": action.name,
+            "drivers": [[fcurve.data_path, fcurve.array_index] for fcurve in fcurves],
+            }
+
+        co = np.empty((len(frames), 2), dtype=np.float32)
+        co[:, 0] = np.asarray(frames, dtype=np.float32)
+        interpolation = np.full(len(frames), KEYFRAME_INTERPOLATION_LINEAR, dtype=np.int32)
+
+        for name, index in zip(names, indices):
+            fcurve = action.fcurves.new(f'key_blocks["{name}"].value', action_group=name)
+            points = fcurve.keyframe_points
+            points.add(len(frames))
+            co[:, 1] = values[:, index]
+            points.foreach_set("co", co.ravel())
+            points.foreach_set("interpolation", interpolation)
+            fcurve.update()
+
+        for fcurve in fcurves:
+            fcurve.mute = True
+
+        animdata.action = action
+    except Exception:
+        if is_baked(key):
+            bake_restore(key)
+        else:
+            bpy.data.actions.remove(action)
+        raise
+
+    return action
+
+
+def bake_restore(key: 'Key') -> None:
+    import bpy
+    data = key.asks.get("bake")
+    if data is None:
+        return
+
+    for path, index in data["drivers"]:
+        fcurve = driver_find(key, path, index)
+        if fcurve:
+            fcurve.mute = False
+
+    animdata = key.animation_data
+    if animdata:
+        animdata.action = bpy.data.actions.get(data["action"]) if data["action"] else None
+
+    action = bpy.data.actions.get(data["baked"])
+    if action and action.users == 0:
+        bpy.data.actions.remove(action)
+
+    del key.asks["bake"]
+
+
+class ASKS_OT_system_bake(PollSystemEnabled, Operator):
+    bl_idname = "asks.system_bake"
+    bl_label = "Bake"
+    bl_description = "Bake shape key values to an action and mute the drivers"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    frame_start: IntProperty(
+        name="Start",
+        default=-1,
+        options=set()
+        )
+
+    frame_end: IntProperty(
+        name="End",
+        default=-1,
+        options=set()
+        )
+
+    @classmethod
+    def poll(cls, context: 'Context') -> bool:
+        return super().poll(context) and not is_baked(context.object.data.shape_keys)
+
+    def execute(self, context: 'Context') -> Set[str]:
+        key = context.object.data.shape_keys
+        scene = context.scene
+        start = scene.frame_start if self.frame_start < 0 else self.frame_start
+        end = scene.frame_end if self.frame_end < 0 else self.frame_end
+        if end < start:
+            self.report({'ERROR'}, "Invalid frame range")
+            return {'CANCELLED'}
+
+        action = bake(key, scene, range(start, end + 1))
+        self.report({'INFO'}, f'Baked {len(action.fcurves)} shape keys to {action.name}')
+        return {'FINISHED'}
+
+
+class ASKS_OT_system_bake_restore(PollSystemEnabled, Operator):
+    bl_idname = "asks.system_bake_restore"
+    bl_label = "Restore Drivers"
+    bl_description = "Remove the baked action and unmute the drivers muted by the bake"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context: 'Context') -> bool:
+        return super().poll(context) and is_baked(context.object.data.shape_keys)
+
+    def execute(self, context: 'Context') -> Set[str]:
+        bake_restore(context.object.data.shape_keys)
+        return {'FINISHED'}
+
+
+class ASKS_PT_bake(PollActiveNode, Panel):
+    bl_idname = "ASKS_PT_bake"
+    bl_label = "Bake"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "data"
+    bl_parent_id = "ASKS_PT_shape_keys"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context: 'Context') -> None:
+        layout = self.layout
+        key = context.object.data.shape_keys
+        if is_baked(key):
+            layout.label(text=f'Baked to {key.asks["bake"]["baked"]}', icon='ACTION')
+            layout.operator("asks.system_bake_restore", icon='DRIVER')
+        else:
+            layout.operator("asks.system_bake", icon='REC')
@@ -1,15 +1,19 @@
 
-from typing import Dict, Iterator, List, Optional, Protocol, Sequence, Set, Tuple, Union, TYPE_CHECKING
+from typing import Dict, Iterable, Iterator, List, Optional, Protocol, Sequence, Set, Tuple, Union, TYPE_CHECKING
 from uuid import uuid4
+from hashlib import blake2b
 from dataclasses import dataclass
-from asks.utils import split_layout
-from mathutils import Vector
+from functools import lru_cache
+import numpy as np
+from asks.utils import PollSystemEnabled, split_layout
 from bpy.types import FCurve, Operator, PropertyGroup, UILayout
 from bpy.props import BoolProperty, CollectionProperty, EnumProperty, FloatVectorProperty, PointerProperty, StringProperty
 from bpy.app import timers
-from .events import EventDispatcher
+from bpy.app.handlers import persistent
+from .config import COMPAT_OBJECTS
+from .events import EventDispatcher, event_batch, log
 if TYPE_CHECKING:
-    from bpy.types import Context, CurveMapping, NodeMapping, NodeTree
+    from bpy.types import Context, CurveMapping, Depsgraph, Key, NodeMapping, NodeTree, ShaderNodeVectorCurve
 
 class CurvePointProtocol(Protocol):
     location: Tuple[float, float]
@@ -19,7 +23,31 @@ class CurvePointProtocol(Protocol):
 #region Utilities
 #--------------------------------------------------------------------------------------------------
 
-_active_curves: Set['Curve'] = set()
+# Custom curves shown in the UI, mapped by identifier to the key's name, the
+# curve's path and the fingerprint of its mapping when it was last synced.
+_active_curves: Dict[str, Tuple[str, str, Optional[int]]] = {}
+
+def _curve_resolve(name: str, path: str) -> Optional['Curve']:
+    import bpy
+    key = bpy.data.shape_keys.get(name)
+    try:
+        curve = key.path_resolve(path) if key else None
+    except ValueError:
+        return None
+    return curve if isinstance(curve, Curve) else None
+
+
+def points_changed(current: Sequence[CurvePointProtocol], points: Sequence[CurvePointProtocol]) -> List[int]:
+    # Indices of the points that differ, up to the length of the shorter of the
+    # two. Locations are compared in single precision as they are stored.
+    count = min(len(current), len(points))
+    location = np.empty(len(current) * 2, dtype=np.float32)
+    current.foreach_get("location", location)
+    source = np.array([tuple(pt.location) for _, pt in zip(range(count), points)], dtype=np.float32)
+    moved = (location[:count * 2] != source.ravel()).reshape(count, 2).any(axis=1)
+    return [index for index, (a, b) in enumerate(zip(current, points))
+            if moved[index] or a.handle_type != b.handle_type or a.select != b.select]
+
 
 def _check_curves_match(curve: 'Curve', mapping: 'CurveMapping') -> bool:
     cpts = curve.points
@@ -36,91 +64,150 @@ def _check_curves_match(curve: 'Curve', mapping: 'CurveMapping') -> bool:
     return False
 
 
-def _check_active_curves():
-    for curve in _active_curves:
-        tree = curve.id_data.asks.nodetree__
-        if tree is not None:
-            node = tree.nodes.get(curve.identifier)
-            if node is not None and _check_curves_match(curve, node.mapping):
-                # TODO remap curve points to 0-1 ranges ?
-                curve.points.__init__(node.mapping.curves[0].points)
-                curve.dispatch("updated")
-    _active_curves.clear()
+def _mapping_fingerprint(mapping: 'CurveMapping') -> int:
+    points = mapping.curves[0].points
+    count = len(points)
+    co = np.empty(count * 2, dtype=np.float32)
+    handle_types = np.empty(count, dtype=np.int32)
+    points.foreach_get("location", co)
+    points.foreach_get("handle_type", handle_types)
+    return hash((co.tobytes(), handle_types.tobytes()))
 
 
-def _calc_bezier_handles(p2, ht, h1, h2, prev=None, next=None) -> None:
-    pt = Vector((0.0, 0.0))
+def _active_curve_add(curve: 'Curve', node: 'ShaderNodeVectorCurve') -> None:
+    identifier = curve.identifier
+    if identifier not in _active_curves:
+        # A mapping that is already out of sync is picked up by the next update
+        mapping = node.mapping
+        fingerprint = None if _check_curves_match(curve, mapping) else _mapping_fingerprint(mapping)
+        _active_curves[identifier] = (curve.id_data.name, curve.path_from_id(), fingerprint)
 
-    if prev is None:
-        p3 = next
-        pt[0] = 2.0 * p2[0] - p3[0]
-        pt[1] = 2.0 * p2[1] - p3[1]
-        p1 = pt
-    else:
-        p1 = prev
 
-    if next is None:
-        p1 = prev
-        pt[0] = 2.0 * p2[0] - p1[0]
-        pt[1] = 2.0 * p2[1] - p1[1]
-        p3 = pt
-    else:
-        p3 = next
-
-    dvec_a = p2 - p1
-    dvec_b = p3 - p2
-    len_a = dvec_a.length
-    len_b = dvec_b.length
-
-    if len_a == 0.0:
-        len_a = 1.0
-    if len_b == 0.0:
-        len_b = 1.0
-
-    if ht in ('AUTO', 'AUTO_CLAMPED'):
-        tvec = Vector((
-            dvec_b[0] / len_b + dvec_a[0] / len_a,
-            dvec_b[1] / len_b + dvec_a[1] / len_a))
-
-        length = tvec.length * 2.5614
-        if length != 0.0:
-            ln = -(len_a / length)
-            h1[0] = p2[0] + tvec[0] * ln
-            h1[1] = p2[1] + tvec[1] * ln
-            if ht == 'AUTO_CLAMPED' and prev is not None and next is not None:
-                ydiff1 = prev[1] - p2[1]
-                ydiff2 = next[1] - p2[1]
-                if (ydiff1 <= 0.0 and ydiff2 <= 0.0) or (ydiff1 >= 0.0 and ydiff2 >= 0.0):
-                    h1[1] = p2[1]
-                else:
-                    if ydiff1 <= 0.0:
-                        if prev[1] > h1[1]:
-                            h1[1] = prev[1]
-                    else:
-                        if prev[1] < h1[1]:
-                            h1[1] = prev[1]
-
-            ln = len_b / length
-            h2[0] = p2[0] + tvec[0] * ln
-            h2[1] = p2[1] + tvec[1] * ln
-            if ht == 'AUTO_CLAMPED' and prev is not None and next is not None:
-                ydiff1 = prev[1] - p2[1]
-                ydiff2 = next[1] - p2[1]
-                if (ydiff1 <= 0.0 and ydiff2 <= 0.0) or (ydiff1 >= 0.0 and ydiff2 >= 0.0):
-                    h2[1] = p2[1]
-                else:
-                    if ydiff1 <= 0.0:
-                        if next[1] < h2[1]:
-                            h2[1] = next[1]
-                    else:
-                        if next[1] > h2[1]:
-                            h2[1] = next[1]
-
-    else: # ht == VECTOR
-        h1[0] = p2[0] + dvec_a[0] * (-1.0/3.0)
-        h1[1] = p2[1] + dvec_a[1] * (-1.0/3.0)
-        h2[0] = p2[0] + dvec_b[0] * (1.0/3.0)
-        h2[1] = p2[1] + dvec_b[1] * (1.0/3.0)
+def active_curves_clear() -> None:
+    _active_curves.clear()
+
+
+@persistent
+@event_batch()
+def active_curves_sync(_, depsgraph: 'Depsgraph') -> None:
+    # Curve mapping widgets only tag their node tree, so nothing needs checking
+    # until a node tree has been updated.
+    if not _active_curves or not depsgraph.id_type_updated('NODETREE'):
+        return
+
+    for identifier, (name, path, fingerprint) in tuple(_active_curves.items()):
+        curve = _curve_resolve(name, path)
+        tree = curve.id_data.asks.nodetree__ if curve else None
+        node = tree.nodes.get(identifier) if tree else None
+        if (node is None
+                or curve.identifier != identifier
+                or curve.type != 'CUSTOM'):
+            del _active_curves[identifier]
+            continue
+
+        mapping = node.mapping
+        value = _mapping_fingerprint(mapping)
+        if value != fingerprint:
+            _active_curves[identifier] = (name, path, value)
+            # TODO remap curve points to 0-1 ranges ?
+            curve.points.__init__(mapping.curves[0].points)
+            curve.dispatch("updated")
+
+
+def bezier_handles(co: np.ndarray, handle_types: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # co is (curves, points, 2) and handle_types (curves, points). The end points
+    # get a virtual neighbour mirrored through them, as in BKE_nurb_handle_calc.
+    prev = np.empty_like(co)
+    next_ = np.empty_like(co)
+    prev[:, 1:] = co[:, :-1]
+    prev[:, 0] = 2.0 * co[:, 0] - co[:, 1]
+    next_[:, :-1] = co[:, 1:]
+    next_[:, -1] = 2.0 * co[:, -1] - co[:, -2]
+
+    dvec_a = co - prev
+    dvec_b = next_ - co
+    len_a = np.linalg.norm(dvec_a, axis=-1)
+    len_b = np.linalg.norm(dvec_b, axis=-1)
+    len_a[len_a == 0.0] = 1.0
+    len_b[len_b == 0.0] = 1.0
+
+    tvec = dvec_b / len_b[..., np.newaxis] + dvec_a / len_a[..., np.newaxis]
+    length = np.linalg.norm(tvec, axis=-1) * 2.5614
+    valid = length != 0.0
+    length[~valid] = 1.0
+
+    # Auto handles are left at the origin when the tangent is degenerate
+    valid = valid[..., np.newaxis]
+    h1 = np.where(valid, co - tvec * (len_a / length)[..., np.newaxis], 0.0)
+    h2 = np.where(valid, co + tvec * (len_b / length)[..., np.newaxis], 0.0)
+
+    clamped = (handle_types == HANDLE_TYPE_ENUM_INDEX['AUTO_CLAMPED']) & valid[..., 0]
+    clamped[:, 0] = False
+    clamped[:, -1] = False
+    if clamped.any():
+        y = co[..., 1]
+        prev_y = prev[..., 1]
+        next_y = next_[..., 1]
+        ydiff1 = prev_y - y
+        ydiff2 = next_y - y
+        extreme = ((ydiff1 <= 0.0) & (ydiff2 <= 0.0)) | ((ydiff1 >= 0.0) & (ydiff2 >= 0.0))
+        rising = ydiff1 <= 0.0
+        h1y = np.where(extreme, y, np.where(rising, np.maximum(h1[..., 1], prev_y), np.minimum(h1[..., 1], prev_y)))
+        h2y = np.where(extreme, y, np.where(rising, np.minimum(h2[..., 1], next_y), np.maximum(h2[..., 1], next_y)))
+        h1[..., 1] = np.where(clamped, h1y, h1[..., 1])
+        h2[..., 1] = np.where(clamped, h2y, h2[..., 1])
+
+    vector = (handle_types == HANDLE_TYPE_ENUM_INDEX['VECTOR'])[..., np.newaxis]
+    h1 = np.where(vector, co - dvec_a / 3.0, h1)
+    h2 = np.where(vector, co + dvec_b / 3.0, h2)
+
+    # Auto end points are aligned with the handle of their neighbour
+    if co.shape[1] > 2:
+        auto = handle_types == HANDLE_TYPE_ENUM_INDEX['AUTO']
+        for index, inner, outer, neighbour, clip in ((0, h2, h1, h1[:, 1], np.maximum),
+                                                      (-1, h1, h2, h2[:, -2], np.minimum)):
+            pt = co[:, index]
+            hlen = np.linalg.norm(inner[:, index] - pt, axis=-1)
+            hvec = neighbour.copy()
+            hvec[:, 0] = clip(hvec[:, 0], pt[:, 0])
+            hvec -= pt
+            nlen = np.linalg.norm(hvec, axis=-1)
+            apply = auto[:, index] & (nlen > 0.00001)
+            hvec *= (hlen / np.where(apply, nlen, 1.0))[:, np.newaxis]
+            apply = apply[:, np.newaxis]
+            inner[:, index] = np.where(apply, pt + hvec, inner[:, index])
+            outer[:, index] = np.where(apply, pt - hvec, outer[:, index])
+
+    return h1, h2
+
+
+def _range_apply(co: np.ndarray, handle_types: np.ndarray, ranges: np.ndarray, axis: int) -> None:
+    a = ranges[:, 0]
+    b = ranges[:, 1]
+    flip = a > b
+    if flip.any():
+        co[flip, :, axis] = 1.0 - co[flip, :, axis]
+        co[flip] = co[flip, ::-1]
+        handle_types[flip] = handle_types[flip, ::-1]
+    co[..., axis] = np.minimum(a, b)[:, np.newaxis] + co[..., axis] * np.abs(b - a)[:, np.newaxis]
+
+
+def _keyframes_compute(co: np.ndarray,
+                       handle_types: np.ndarray,
+                       input_ranges: Optional[np.ndarray]=None,
+                       value_ranges: Optional[np.ndarray]=None) -> np.ndarray:
+    # Returns (curves, points, [co, handle_left, handle_right], 2)
+    if input_ranges is not None:
+        _range_apply(co, handle_types, input_ranges, 0)
+    if value_ranges is not None:
+        _range_apply(co, handle_types, value_ranges, 1)
+
+    h1, h2 = bezier_handles(co, handle_types)
+    h1[:, 0, 0] = 0.0
+    h1[:, 0, 1] = co[:, 0, 1]
+    h2[:, -1, 0] = 1.0
+    h2[:, -1, 1] = co[:, -1, 1]
+    return np.stack((co, h1, h2), axis=2)
 
 
 def _get_node_tree(curve: 'Curve', ensure: Optional[bool]=False) -> Optional['NodeTree']:
@@ -133,18 +220,197 @@ def _get_node_tree(curve: 'Curve', ensure: Optional[bool]=False) -> Optional['No
     return tree
 
 
-def _add_node(curve: 'Curve') -> None:
+def _points_digest(points: Sequence['CurvePoint']) -> str:
+    count = len(points)
+    co = np.empty(count * 2, dtype=np.float32)
+    handle_types = np.empty(count, dtype=np.int32)
+    points.foreach_get("location", co)
+    points.foreach_get("handle_type", handle_types)
+    return blake2b(co.tobytes() + handle_types.tobytes(), digest_size=10).hexdigest()
+
+
+def _node_name(curve: 'Curve') -> str:
+    # Custom curves are edited through their node so each one owns a node named
+    # after it. Other curves share a node with every curve of the same points.
+    if curve.type == 'CUSTOM':
+        return curve.identifier
+    return f'asks_curve_shared_{_points_digest(curve.points.internal__)}'
+
+
+def _node_points_set(node: 'ShaderNodeVectorCurve', points: Sequence['CurvePoint']) -> None:
+    pts = node.mapping.curves[0].points
+    amt = len(points)
+    resized = len(pts) != amt
+    while len(pts) > amt: pts.remove(pts[-1])
+    while len(pts) < amt: pts.new(0.0, 0.0)
+    changed = points_changed(pts, points)
+    for index in changed:
+        pt = pts[index]
+        data = points[index]
+        pt.handle_type = data.handle_type
+        pt.location = data.location
+        pt.select = data.select
+    if resized or changed:
+        node.mapping.update()
+
+
+def _get_node(curve: 'Curve') -> Optional['ShaderNodeVectorCurve']:
+    tree = _get_node_tree(curve)
+    if tree:
+        return tree.nodes.get(_node_name(curve))
+
+
+def _add_node(curve: 'Curve') -> 'ShaderNodeVectorCurve':
     tree = _get_node_tree(curve, True)
-    node = tree.nodes.new("ShaderNodeVectorCurve")
-    node.name = curve.identifier
-    mapping = node.mapping
-    mapping.extend = 'HORIZONTAL'
-    mapping.clip_min_x = 0.0
-    mapping.clip_max_x = 1.0
-    mapping.clip_min_y = 0.0
-    mapping.clip_max_y = 1.0
-    mapping.use_clip = True
-    mapping.update()
+    name = _node_name(curve)
+    node = tree.nodes.get(name)
+    if node is None:
+        node = tree.nodes.new("ShaderNodeVectorCurve")
+        node.name = name
+        mapping = node.mapping
+        mapping.extend = 'HORIZONTAL'
+        mapping.clip_min_x = 0.0
+        mapping.clip_max_x = 1.0
+        mapping.clip_min_y = 0.0
+        mapping.clip_max_y = 1.0
+        mapping.use_clip = True
+        _node_points_set(node, curve.points)
+    return node
+
+
+def curve_nodes_collect(key: 'Key', keep: Optional[Set[str]]=None) -> Tuple[int, int]:
+    # Removes the curve nodes of the system that are not in keep. The nodes are
+    # created again from the curve points when their editor is next drawn.
+    # Returns the number of nodes and mapping points removed.
+    tree = key.asks.nodetree__
+    if tree is None:
+        return 0, 0
+
+    unused = [node for node in tree.nodes if not keep or node.name not in keep]
+    points = sum(len(node.mapping.curves[0].points) for node in unused if hasattr(node, "mapping"))
+    for node in unused:
+        tree.nodes.remove(node)
+    return len(unused), points
+
+
+def curve_nodes_migrate(key: 'Key', curves: Iterable['Curve']) -> int:
+    # Older files kept a node for every curve, named after it. Only custom
+    # curves still own a node, the others draw from shared nodes created when
+    # needed. Returns the number of nodes removed.
+    tree = key.asks.nodetree__
+    if tree is None:
+        return 0
+
+    names = {curve.identifier for curve in curves if curve.type != 'CUSTOM'}
+    stale = [node for node in tree.nodes if node.name in names]
+    for node in stale:
+        tree.nodes.remove(node)
+    return len(stale)
+
+
+# Approximate sizes of the data of a curve node, used to estimate what removing
+# nodes saves. Each node stores its sockets and a mapping of four curves, every
+# curve also keeps a table of 257 evaluated points that is never saved.
+CURVE_NODE_BYTES = 2048
+CURVE_NODE_TABLE_BYTES = 4 * 257 * 12
+CURVE_POINT_BYTES = 12
+
+
+def curve_nodes_size(key: 'Key') -> Tuple[int, int]:
+    # Returns the estimated memory and file size of the curve nodes in bytes
+    tree = key.asks.nodetree__
+    if tree is None:
+        return 0, 0
+
+    count = 0
+    points = 0
+    for node in tree.nodes:
+        count += 1
+        if hasattr(node, "mapping"):
+            points += sum(len(curve.points) for curve in node.mapping.curves)
+    size = count * CURVE_NODE_BYTES + points * CURVE_POINT_BYTES
+    return size + count * CURVE_NODE_TABLE_BYTES, size
+
+
+# Curve nodes are created when an editor is drawn. They are collected before
+# the file is saved rather than periodically, as an open popover may show a
+# node without drawing it again, and removing it would leave the editor with
+# a freed mapping. Nodes drawn since the last save are kept.
+
+# Curves waiting for a node, mapped by identifier to the key's name and the
+# curve's path. Nodes can not be added while drawing.
+_requested_nodes: Dict[str, Tuple[str, str]] = {}
+
+# Names of the curve nodes drawn since the last save, by key name
+_drawn_nodes: Dict[str, Set[str]] = {}
+
+
+def _redraw_properties() -> None:
+    import bpy
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'PROPERTIES':
+                area.tag_redraw()
+
+
+def _requested_nodes_add() -> None:
+    for identifier, (name, path) in tuple(_requested_nodes.items()):
+        curve = _curve_resolve(name, path)
+        if curve is not None and curve.identifier == identifier:
+            _add_node(curve)
+    _requested_nodes.clear()
+    _redraw_properties()
+
+
+def _node_request(curve: 'Curve') -> None:
+    _requested_nodes[curve.identifier] = (curve.id_data.name, curve.path_from_id())
+    if not timers.is_registered(_requested_nodes_add):
+        timers.register(_requested_nodes_add, first_interval=0.0)
+
+
+def _curve_nodes_displayed() -> Dict[str, Set[str]]:
+    # The curves of the active shape key of each window's active object may be
+    # on screen without having been redrawn recently.
+    import bpy
+    result = {}
+    for window in bpy.context.window_manager.windows:
+        ob = window.view_layer.objects.active
+        key = ob.data.shape_keys if ob is not None and ob.type in COMPAT_OBJECTS else None
+        if key is None or not key.asks.enabled:
+            continue
+        node = key.asks.nodes.active
+        if node is not None:
+            names = result.setdefault(key.name, set())
+            names.add(_node_name(node.curve))
+            if node.driver:
+                names.add(_node_name(node.driver.curve))
+    return result
+
+
+def _curve_nodes_kept() -> Dict[str, Set[str]]:
+    keep = _curve_nodes_displayed()
+    for name, names in _drawn_nodes.items():
+        keep.setdefault(name, set()).update(names)
+    for identifier, (name, _, _) in _active_curves.items():
+        keep.setdefault(name, set()).add(identifier)
+    return keep
+
+
+@persistent
+def curve_nodes_save_collect(_) -> None:
+    import bpy
+    keep = _curve_nodes_kept()
+    _drawn_nodes.clear()
+    for key in bpy.data.shape_keys:
+        if key.is_property_set("asks") and key.asks.nodetree__ is not None:
+            curve_nodes_collect(key, keep.get(key.name, set()))
+
+
+def curve_nodes_release() -> None:
+    _requested_nodes.clear()
+    _drawn_nodes.clear()
+    if timers.is_registered(_requested_nodes_add):
+        timers.unregister(_requested_nodes_add)
 
 #endregion Utilities
 
@@ -330,13 +596,13 @@ class CurvePoints(PropertyGroup):
         length = len(items_)
         number = len(points)
         while length > number:
-            items_.remove(0)
             length -= 1
+            items_.remove(length)
         while length < number:
             items_.add()
             length += 1
-        for item, point in zip(items_, points):
-            item.__init__(point)
+        for index in points_changed(items_, points):
+            items_[index].__init__(points[index])
 
     def __contains__(self, point: CurvePoint) -> bool:
         return any(x == point for x in self)
@@ -393,10 +659,15 @@ def _curve_easing_update_handler(curve: 'Curve', _: 'Context') -> None:
 def _curve_type_update_handler(curve: 'Curve', _: 'Context') -> None:
     type_ = curve.type
     if type_ != 'CUSTOM':
+        curve.__dispose__()
         pts = PRESETS[type_] if type_ == 'LINEAR' else PRESETS[f'{type_}{curve.easing[4:]}']
         curve.points.__init__(pts)
         curve.__load__()
         curve.dispatch("updated")
+    else:
+        # Custom curves are always interpolated by keyframes, so nodes using
+        # analytic easing need their keyframes back.
+        curve.dispatch("updated")
 
 
 class Curve(EventDispatcher, PropertyGroup):
@@ -432,22 +703,19 @@ class Curve(EventDispatcher, PropertyGroup):
     def __init__(self) -> None:
         self["identifier"] = f'asks_curve_{uuid4().hex}'
         self.points.__init__(PRESETS['LINEAR'])
-        _add_node(self)
 
     def __load__(self) -> None:
+        if self.type == 'CUSTOM':
+            node = _get_node(self)
+            if node:
+                _node_points_set(node, self.points)
+
+    def __dispose__(self) -> None:
         tree = _get_node_tree(self)
         if tree:
             node = tree.nodes.get(self.identifier)
             if node:
-                pts = node.mapping.curves[0].points
-                amt = len(self.points)
-                while len(pts) > amt: pts.remove(pts[-2])
-                while len(pts) < amt: pts.new(0.0, 0.0)
-                for pt, data in zip(pts, self.points):
-                    pt.handle_type = data.handle_type
-                    pt.location = data.location
-                    pt.select = data.select
-                node.mapping.update()
+                tree.nodes.remove(node)
 
     def assign(self,
                fcurve: FCurve,
@@ -457,113 +725,179 @@ class Curve(EventDispatcher, PropertyGroup):
         if not isinstance(fcurve, FCurve):
             raise TypeError()
 
-        pts = [(
-            p.location.copy(),
-            p.handle_type,
-            Vector((0.0, 0.0)),
-            Vector((0.0, 0.0))
-            ) for p in self.points.internal__]
-
-        if input_range:
-            a, b = input_range
-            if a > b:
-                a, b = b, a
-                for pt in pts:
-                    co = pt[0]
-                    co[0] = 1.0 - co[0]
-                pts.reverse()
-            d = b - a
-            for pt in pts:
-                co = pt[0]
-                co[0] = a + co[0] * d
-
-        if value_range:
-            a, b = value_range
-            if a > b:
-                a, b = b, a
-                for pt in pts:
-                    co = pt[0]
-                    co[1] = 1.0 - co[1]
-                pts.reverse()
-            d = b - a
-            for pt in pts:
-                co = pt[0]
-                co[1] = a + co[1] * d
-
-        n = len(pts) - 1
-        for i, (pt, ht, h1, h2) in enumerate(pts):
-            _calc_bezier_handles(pt, ht, h1, h2,
-                                pts[i-1][0] if i > 0 else None,
-                                pts[i+1][0] if i < n else None)
-
-        if len(pts) > 2:
-            ptA, htA, h1A, h2A = pts[0]
-            ptN, htN, h1N, h2N = pts[-1]
-
-            if htA == 'AUTO':
-                hlen = (h2A - ptA).length
-                hvec = pts[1][2].copy()
-                if hvec[0] < ptA[0]:
-                    hvec[0] = ptA[0]
-
-                hvec -= ptA
-                nlen = hvec.length
-                if nlen > 0.00001:
-                    hvec *= hlen / nlen
-                    h2A[0] = hvec[0] + ptA[0]
-                    h2A[1] = hvec[1] + ptA[1]
-                    h1A[0] = ptA[0] - hvec[0]
-                    h1A[1] = ptA[1] - hvec[1]
-
-            if htN == 'AUTO':
-                hlen = (h1N - ptN).length
-                hvec = pts[-2][3].copy()
-                if hvec[0] > ptN[0]:
-                    hvec[0] = ptN[0]
-
-                hvec -= ptN
-                nlen = hvec.length
-                if nlen > 0.00001:
-                    hvec *= hlen / nlen
-                    h1N[0] = hvec[0] + ptN[0]
-                    h1N[1] = hvec[1] + ptN[1]
-                    h2N[0] = ptN[0] - hvec[0]
-                    h2N[1] = ptN[1] - hvec[1]
-
-        pt = pts[0]
-        co = pt[0]
-        hl = pt[2]
-        hl[0] = 0.0
-        hl[1] = co[1]
-
-        pt = pts[-1]
-        co = pt[0]
-        hr = pt[3]
-        hr[0] = 1.0
-        hr[1] = co[1]
-
-        kfs = fcurve.keyframe_points
-        nkf = len(kfs)
-        npt = len(pts)
-
-        while nkf > npt:
-            kfs.remove(kfs[-1])
-            nkf -= 1
-
-        for i, pt in enumerate(pts):
-            if i < nkf:
-                kf = kfs[i]
-            else:
-                co = pt[0]
-                kf = kfs.insert(co[0], co[1])
-            
-            kf.interpolation = 'BEZIER'
-            kf.easing = 'AUTO'
-            kf.co = pt[0]
-            kf.handle_left_type = 'FREE'
-            kf.handle_right_type = 'FREE'
-            kf.handle_left = pt[2]
-            kf.handle_right = pt[3]
+        assign_keyframes(fcurve, self.keyframes(input_range, value_range))
+
+    def keyframes(self,
+                  input_range: Optional[Tuple[float, float]]=None,
+                  value_range: Optional[Tuple[float, float]]=None) -> np.ndarray:
+        type_ = self.type
+        if type_ != 'CUSTOM':
+            return preset_keyframes(type_, self.easing, input_range, value_range)
+        return curves_keyframes((self,), input_range and (input_range,), value_range and (value_range,))[0]
+
+
+def curves_keyframes(curves: Sequence[Curve],
+                     input_ranges: Optional[Sequence[Tuple[float, float]]]=None,
+                     value_ranges: Optional[Sequence[Tuple[float, float]]]=None) -> List[np.ndarray]:
+    # Curves with the same number of points are computed together
+    result: List[Optional[np.ndarray]] = [None] * len(curves)
+    batches: Dict[int, List[int]] = {}
+    for index, curve in enumerate(curves):
+        batches.setdefault(len(curve.points), []).append(index)
+
+    for count, indices in batches.items():
+        co = np.empty((len(indices), count * 2), dtype=float)
+        handle_types = np.empty((len(indices), count), dtype=int)
+        for row, index in enumerate(indices):
+            points = curves[index].points.internal__
+            points.foreach_get("location", co[row])
+            points.foreach_get("handle_type", handle_types[row])
+
+        data = _keyframes_compute(co.reshape(len(indices), count, 2),
+                                  handle_types,
+                                  None if input_ranges is None else np.array([input_ranges[i] for i in indices], dtype=float),
+                                  None if value_ranges is None else np.array([value_ranges[i] for i in indices], dtype=float))
+        for row, index in enumerate(indices):
+            result[index] = data[row]
+
+    return result
+
+
+# Preset curves can not be edited, so their keyframes only depend on the preset
+# and the ranges and are shared by every curve using them.
+KEYFRAMES_CACHE_SIZE = 512
+
+
+@lru_cache(maxsize=KEYFRAMES_CACHE_SIZE)
+def _preset_keyframes(preset: str,
+                      input_range: Optional[Tuple[float, float]],
+                      value_range: Optional[Tuple[float, float]]) -> np.ndarray:
+    points = PRESETS[preset]
+    co = np.array([[point.location for point in points]], dtype=float)
+    handle_types = np.array([[HANDLE_TYPE_ENUM_INDEX[point.handle_type] for point in points]], dtype=int)
+    data = _keyframes_compute(co,
+                              handle_types,
+                              None if input_range is None else np.array([input_range], dtype=float),
+                              None if value_range is None else np.array([value_range], dtype=float))[0]
+    data.flags.writeable = False
+    return data
+
+
+def preset_keyframes(type_: str,
+                     easing: str,
+                     input_range: Optional[Tuple[float, float]]=None,
+                     value_range: Optional[Tuple[float, float]]=None) -> np.ndarray:
+    preset = type_ if type_ == 'LINEAR' else f'{type_}{easing[4:]}'
+    return _preset_keyframes(preset,
+                             tuple(input_range) if input_range else None,
+                             tuple(value_range) if value_range else None)
+
+
+def keyframes_cache_info():
+    return _preset_keyframes.cache_info()
+
+
+def keyframes_cache_clear() -> None:
+    _preset_keyframes.cache_clear()
+
+
+# Exponents of the power curves fitted to the preset curves (minimax over the
+# 0.0-1.0 range). In and out presets share their exponent. Analytic easing
+# evaluates these curves instead of the preset's keyframes.
+EASING_EXPONENTS = {
+    'SINE_IN'     : 1.532,
+    'SINE_OUT'    : 1.532,
+    'SINE_IN_OUT' : 1.731,
+    'QUAD_IN'     : 1.639,
+    'QUAD_OUT'    : 1.639,
+    'QUAD_IN_OUT' : 1.991,
+    'CUBIC_IN'    : 2.046,
+    'CUBIC_OUT'   : 2.046,
+    'CUBIC_IN_OUT': 2.827,
+    'QUART_IN'    : 2.334,
+    'QUART_OUT'   : 2.334,
+    'QUART_IN_OUT': 3.628,
+    'QUINT_IN'    : 2.564,
+    'QUINT_OUT'   : 2.564,
+    'QUINT_IN_OUT': 4.290,
+    }
+
+# Maximum deviation of an analytic easing from its preset curve. The fitted
+# curves deviate by 0.002 (QUAD in & out) to 0.0135 (QUINT in & out), under 1.5%
+# of the value range.
+EASING_TOLERANCE = 0.015
+EASING_SAMPLES = 257
+
+
+def easing_exponent(type_: str, easing: str) -> float:
+    return EASING_EXPONENTS.get(f'{type_}{easing[4:]}', 1.0)
+
+
+def easing_evaluate(type_: str,
+                    easing: str,
+                    x: np.ndarray,
+                    input_range: Optional[Tuple[float, float]]=None,
+                    value_range: Optional[Tuple[float, float]]=None) -> np.ndarray:
+    t = np.asarray(x, dtype=float)
+    if input_range:
+        a, b = input_range
+        t = (t - a) / (b - a)
+    t = np.clip(t, 0.0, 1.0)
+
+    if type_ != 'LINEAR':
+        n = easing_exponent(type_, easing)
+        if easing == 'EASE_IN':
+            t = np.power(t, n)
+        elif easing == 'EASE_OUT':
+            t = 1.0 - np.power(1.0 - t, n)
+        else:
+            t = (np.power(2.0 * np.minimum(t, 0.5), n) + 1.0 - np.power(2.0 - 2.0 * np.maximum(t, 0.5), n)) / 2.0
+
+    if value_range:
+        a, b = value_range
+        t = a + t * (b - a)
+    return t
+
+
+@lru_cache(maxsize=None)
+def easing_deviation(type_: str, easing: str) -> float:
+    # Maximum difference between a preset curve and its analytic easing
+    from .evaluator import fcurve_evaluate
+    x = np.linspace(0.0, 1.0, EASING_SAMPLES)
+    y = fcurve_evaluate(preset_keyframes(type_, easing), x)
+    deviation = float(np.abs(y - easing_evaluate(type_, easing, x)).max())
+    if deviation > EASING_TOLERANCE:
+        log.warning(f'Analytic {type_.lower()} easing deviates from the preset curve by {deviation:.4f}')
+    return deviation
+
+
+# Keyframe enum values for foreach_set
+KEYFRAME_INTERPOLATION_BEZIER = 2
+KEYFRAME_EASING_AUTO = 0
+KEYFRAME_HANDLE_TYPE_FREE = 0
+
+
+def assign_keyframes(fcurve: FCurve, keyframes: np.ndarray) -> None:
+    keyframes = np.asarray(keyframes, dtype=np.float32)
+    kfs = fcurve.keyframe_points
+    nkf = len(kfs)
+    npt = len(keyframes)
+
+    while nkf > npt:
+        kfs.remove(kfs[-1], fast=True)
+        nkf -= 1
+
+    if nkf < npt:
+        kfs.add(npt - nkf)
+
+    kfs.foreach_set("interpolation", np.full(npt, KEYFRAME_INTERPOLATION_BEZIER, dtype=np.int32))
+    kfs.foreach_set("easing", np.full(npt, KEYFRAME_EASING_AUTO, dtype=np.int32))
+    kfs.foreach_set("handle_left_type", np.full(npt, KEYFRAME_HANDLE_TYPE_FREE, dtype=np.int32))
+    kfs.foreach_set("handle_right_type", np.full(npt, KEYFRAME_HANDLE_TYPE_FREE, dtype=np.int32))
+    kfs.foreach_set("co", keyframes[:, 0].ravel())
+    kfs.foreach_set("handle_left", keyframes[:, 1].ravel())
+    kfs.foreach_set("handle_right", keyframes[:, 2].ravel())
+    fcurve.update()
 
 
 def draw_curve(layout: 'UILayout',
@@ -584,7 +918,12 @@ def draw_curve(layout: 'UILayout',
     #     row.operator(BLCMAP_OT_node_ensure.bl_idname, text="Reload")
     #     return
 
-    node = curve.id_data.asks.nodetree__.nodes[curve.identifier]
+    node = _get_node(curve)
+    if node is None:
+        _node_request(curve)
+        box.label(icon='TIME', text="Loading Curve")
+        return fields
+    _drawn_nodes.setdefault(curve.id_data.name, set()).add(node.name)
 
     header = box.row()
     header.ui_units_y = 0.01
@@ -595,9 +934,7 @@ def draw_curve(layout: 'UILayout',
 
     type_ = curve.type
     if type_ == 'CUSTOM':
-        _active_curves.add(curve)
-        if not timers.is_registered(_check_active_curves):
-            timers.register(_check_active_curves, first_interval=1.0)
+        _active_curve_add(curve, node)
 
         leading.prop(curve, "type", text="")
 
@@ -661,11 +998,9 @@ class CurveOperatorMixin:
     def resolve_node_mapping(context: 'Context') -> Optional['NodeMapping']:
         curve = getattr(context, "curve", None)
         if curve:
-            tree = _get_node_tree(curve)
-            if tree:
-                node = tree.nodes.get(curve.identifier)
-                if node:
-                    return node.mapping
+            node = _get_node(curve)
+            if node:
+                return node.mapping
 
 
 class ASKS_OT_curve_point_handle_type_set(CurveOperatorMixin, Operator):
@@ -706,4 +1041,27 @@ class ASKS_OT_curve_point_remove(CurveOperatorMixin, Operator):
             mapping.update()
         return {'FINISHED'}
 
+
+
+class ASKS_OT_curve_nodes_cleanup(PollSystemEnabled, Operator):
+    bl_idname = "asks.curve_nodes_cleanup"
+    bl_label = "Clean Up Curves"
+    bl_description = "Remove the curve nodes of editors that are not shown. They are created again when needed"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context: 'Context') -> Set[str]:
+        key = context.object.data.shape_keys
+        tree = key.asks.nodetree__
+        before = len(tree.nodes) if tree else 0
+        memory, file = curve_nodes_size(key)
+        nodes, points = curve_nodes_collect(key, _curve_nodes_displayed().get(key.name))
+        memory_after, file_after = curve_nodes_size(key)
+        message = (f'{key.name}: removed {nodes} of {before} curve nodes '
+                   f'({points} mapping points), {before - nodes} left. '
+                   f'Estimated memory {memory:,} to {memory_after:,} bytes, '
+                   f'file size {file:,} to {file_after:,} bytes')
+        log.info(message)
+        self.report({'INFO'}, message)
+        return {'FINISHED'}
+
 #endregion Operators
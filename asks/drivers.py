@@ -21,6 +21,15 @@ from .utils import (ShapeKeyReference,
                     aim_vector,
                     split_layout)
 from .curves import Curve, draw_curve
+from .events import bind_class, event_batch
+from .poses import pose_group_update, pose_settings_sync
+from .fcurves import driver_ensure, driver_find
+from .expressions import (expression_clamp,
+                          expression_max,
+                          expression_mean,
+                          expression_min,
+                          expression_product,
+                          expression_set)
 if TYPE_CHECKING:
     from bpy.types import (ChannelDriverVariables,
                            Context,
@@ -57,14 +66,9 @@ TYPE_ENUM_ICONS = {
 
 
 def _fcurve_get(driver: 'WeightDriver', ensure: Optional[bool]=False) -> Optional['FCurve']:
-    animdata = driver.id_data.animation_data
-    if animdata is None:
-        if ensure: animdata = driver.id_data.animation_data_create()
-        else: return
-    fcurve = animdata.drivers.find(driver.data_path)
-    if fcurve is None and ensure:
-        fcurve = animdata.drivers.new(driver.data_path)
-    return fcurve
+    if ensure:
+        return driver_ensure(driver.id_data, driver.data_path)
+    return driver_find(driver.id_data, driver.data_path)
 
 
 def _variables_clear(variables: 'ChannelDriverVariables') -> None:
@@ -72,78 +76,37 @@ def _variables_clear(variables: 'ChannelDriverVariables') -> None:
         variables.remove(variable)
 
 
-def _cone_driver_expression_format(value: Quaternion) -> None:
+def _cone_driver_expression_format(value: Quaternion) -> str:
     x, y, z = aim_vector(value)
     # The function runs through the following steps:
     # - Convert the target bone's (local space) rotation quaternion to a direction vector
     # - Calculate the dot product between the pose's direction vector and the target bone's rotation vector
     # - Range the result and apply a inverse sine function to negate the effect of the dot product calculation so that the fcurve operates in the 0-1 range
-    return f'(asin(2.0*(x*y-w*z)*{x:.3f}+(1.0-2.0*(x*x+z*z))*{y:.3f}+2.0*(y*z+w*x)*{z:.3f})--(pi/2.0))/pi'
+    # The dot product is clamped as rounding can push it outside of the domain of asin.
+    dot = expression_clamp(f'2.0*(x*y-w*z)*{x:.3f}+(1.0-2.0*(x*x+z*z))*{y:.3f}+2.0*(y*z+w*x)*{z:.3f}', -1.0, 1.0)
+    return f'(asin({dot})+pi/2.0)/pi'
 
 
 def _combination_driver_expression_update(driver: 'Driver', type_: str) -> None:
     keys = tuple(driver.variables.keys())
-    if not len(keys):
-        driver.expression = "0.0"
-    elif type_ == 'MULTIPLY':
-        driver.expression = f'{"*".join(keys)}'
+    if type_ == 'MULTIPLY':
+        expression_set(driver, expression_product(keys))
     elif type_ == 'MIN':
-        driver.expression = f'min({",".join(keys)})'
+        expression_set(driver, expression_min(keys))
     elif type_ == 'MAX':
-        driver.expression = f'max({",".join(keys)})'
+        expression_set(driver, expression_max(keys))
     else:
-        driver.expression = f'({"+".join(keys)})/{str(float(len(keys)))}'
+        expression_set(driver, expression_mean(keys))
 
 
-def _pose_driver_update(driver: 'Driver', settings: 'WeightDriver') -> None:
-    variables = driver.variables
-    _variables_clear(variables)
-
-    id_ = bpy.data.objects.get(settings.data_target)
-    if not id_:
-        driver.expression = "0.0"
-        return
-
-    posedata = []
-    poseprop = f'{settings.data_path[2:-2]}_pose'
-    normprop = f'{settings.data_path[2:-2]}_norm'
-
-    flags = settings.use_location
-    if True in flags:
-        for index, (value, inuse) in enumerate(zip(settings.location, flags)):
-            if inuse:
-                input_ = variables.new()
-                input_.type = 'TRANSFORMS'
-                input_.name = next(var_names)
-
-                target = input_.targets[0]
-                target.transform_type = f'LOC_{"XYZ"[index]}'
-                target.transform_space = 'LOCAL_SPACE'
-                target.id = id_
-                target.bone_target = settings.bone_target
-
-                param = variables.new()
-                param.type = 'SINGLE_PROP'
-                param.name = next(var_names)
-
-                target = param.targets[0]
-                target.id_type = 'KEY'
-                target.id = settings.id_data
-                target.data_path = f'["{poseprop}"][{len(posedata)}]'
-
-                posedata.append(value)
-                parts.append(f'pow({input_.name}-{param.name},2.0)')
-
-                norm = variables.new()
-                norm.type = 'SINGLE_PROP'
-                norm.name = next(var_names)
-
-                target = norm.targets[0]
-                target.id_type = 'KEY'
-                target.id = group.id_data
-                target.data_path = idprop_path(group, 0)
-
-                distances.append(f'sqrt({"+".join(parts)})/{norm.name}')
+def _pose_driver_update(settings: 'WeightDriver', sync: Optional[bool]=False) -> None:
+    if settings.type == 'POSE':
+        node = settings.id_data.path_resolve(settings.path_from_id().rpartition(".")[0])
+        group = settings.id_data.asks.groups.get(node.group) if node.group else None
+        if group:
+            if sync:
+                pose_settings_sync(settings, group)
+            pose_group_update(group)
 
 
 def _weight_driver_subtype_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
@@ -152,6 +115,8 @@ def _weight_driver_subtype_update_handler(driver: 'WeightDriver', _: 'Context')
 
 
 def _bone_target_get(driver: 'WeightDriver') -> str:
+    if driver.type == 'POSE':
+        return driver.get("bone_target", "")
     fc = _fcurve_get(driver)
     if fc:
         vars_ = fc.driver.variables
@@ -161,7 +126,10 @@ def _bone_target_get(driver: 'WeightDriver') -> str:
 
 
 def _bone_target_set(driver: 'WeightDriver', value: str) -> None:
-    if driver.type != 'CUSTOM':
+    if driver.type == 'POSE':
+        driver["bone_target"] = value
+        _pose_driver_update(driver, True)
+    elif driver.type != 'CUSTOM':
         fc = _fcurve_get(driver)
         if fc:
             for var in fc.driver.variables:
@@ -169,6 +137,8 @@ def _bone_target_set(driver: 'WeightDriver', value: str) -> None:
 
 
 def _data_target_get(driver: 'WeightDriver') -> str:
+    if driver.type == 'POSE':
+        return driver.get("data_target", "")
     fc = _fcurve_get(driver)
     if fc:
         vars_ = fc.driver.variables
@@ -180,7 +150,9 @@ def _data_target_get(driver: 'WeightDriver') -> str:
 
 def _data_target_set(driver: 'WeightDriver', value: str) -> None:
     driver["data_target"] = value
-    if driver.type != 'CUSTOM':
+    if driver.type == 'POSE':
+        _pose_driver_update(driver, True)
+    elif driver.type != 'CUSTOM':
         vars_ = _fcurve_get(driver, True).driver.variables
         import bpy
         ob = bpy.data.objects.get(value)
@@ -197,7 +169,8 @@ def _data_target_set(driver: 'WeightDriver', value: str) -> None:
 
 def _curve_update_handler(curve: Curve) -> None:
     driver = curve.id_data.path_resolve(curve.path_from_id().rpartition(".")[0])
-    _driver_curve_update_handler(driver)
+    if isinstance(driver, WeightDriver):
+        _driver_curve_update_handler(driver)
 
 
 def _driver_curve_update_handler(driver: 'WeightDriver') -> None:
@@ -223,8 +196,10 @@ def _mute_set(driver: 'WeightDriver', value: bool) -> None:
 def _transform_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
     type_ = driver.type
     if type_ == 'CONE':
-        driver = _fcurve_get(driver, True).driver
-        driver.expression = _cone_driver_expression_format(driver.rotation_quaternion)
+        expression_set(_fcurve_get(driver, True).driver,
+                       _cone_driver_expression_format(driver.rotation_quaternion))
+    elif type_ == 'POSE':
+        _pose_driver_update(driver)
 
 
 def _location_get(driver: 'WeightDriver') -> Vector:
@@ -240,6 +215,12 @@ def _location_set(driver: 'WeightDriver', value: Tuple[float, float, float]) ->
 def _radius_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
     if driver.type == 'CONE':
         _driver_curve_update_handler(driver)
+    elif driver.type == 'POSE':
+        _pose_driver_update(driver)
+
+
+def _auto_adjust_radius_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
+    _pose_driver_update(driver)
 
 
 def _rotation_euler_get(driver: 'WeightDriver') -> Euler:
@@ -253,8 +234,7 @@ def _rotation_euler_set(driver: 'WeightDriver', value: Tuple[float, float, float
 
 
 def _rotation_order_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
-    # TODO
-    pass
+    _pose_driver_update(driver, True)
 
 
 def _rotation_quaternion_get(driver: 'WeightDriver') -> Quaternion:
@@ -289,8 +269,7 @@ def _rotation_angle_set(driver: 'WeightDriver', value: float) -> None:
 
 
 def _rotation_mode_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
-    # TODO
-    pass
+    _pose_driver_update(driver, True)
 
 
 def _scale_get(driver: 'WeightDriver') -> Vector:
@@ -304,8 +283,7 @@ def _scale_set(driver: 'WeightDriver', value: Tuple[float, float, float]) -> Non
 
 
 def _swing_twist_axis_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
-    # TODO
-    pass
+    _pose_driver_update(driver, True)
 
 
 def _value_range_min_get(driver: 'WeightDriver') -> float:
@@ -327,18 +305,15 @@ def _value_range_max_set(driver: 'WeightDriver', value: float) -> None:
 
 
 def _use_location_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
-    # TODO
-    pass
+    _pose_driver_update(driver, True)
 
 
 def _use_rotation_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
-    # TODO
-    pass
+    _pose_driver_update(driver, True)
 
 
 def _use_scale_update_handler(driver: 'WeightDriver', _: 'Context') -> None:
-    # TODO
-    pass
+    _pose_driver_update(driver, True)
 
 
 
@@ -347,7 +322,8 @@ class WeightDriver(PropertyGroup):
     auto_adjust_radius: BoolProperty(
         name="Auto-Adjust",
         default=False,
-        options=set()
+        options=set(),
+        update=_auto_adjust_radius_update_handler
         )
 
     bone_target: StringProperty(
@@ -598,9 +574,7 @@ class WeightDriver(PropertyGroup):
         self["type"] = TYPE_ENUM_INDEX[type_]
         self["data_path"] = path
         
-        curve = self.curve
-        curve.__init__()
-        curve.bind("updated", _curve_update_handler)
+        self.curve.__init__()
 
         fcurve = _fcurve_get(self, True)
         driver = fcurve.driver
@@ -614,8 +588,6 @@ class WeightDriver(PropertyGroup):
 
         elif type_ == 'CONE':
             self["radius"] = 0.2
-            driver.type = 'SCRIPTED'
-            driver.expression = _cone_driver_expression_format(self.rotation_quaternion)
             _variables_clear(vars_)
             for axis in 'WXYZ':
                 var = vars_.new()
@@ -625,16 +597,19 @@ class WeightDriver(PropertyGroup):
                 tgt.transform_type = f'ROT_{axis}'
                 tgt.transform_space = 'LOCAL_SPACE'
                 tgt.rotation_mode = 'QUATERNION'
+            expression_set(driver, _cone_driver_expression_format(self.rotation_quaternion))
 
         elif type_ == 'COMBINATION':
-            driver.type = 'SCRIPTED'
-            driver.expression = "0.0"
             _variables_clear(vars_)
+            expression_set(driver, "0.0")
 
         elif type_ == 'POSE':
-            driver.type = 'SCRIPTED'
-            driver.expression = "0.0"
             _variables_clear(vars_)
+            expression_set(driver, "0.0")
+            _pose_driver_update(self)
+
+
+bind_class(Curve, "updated", _curve_update_handler)
 
 
 #region Draw Functions
@@ -831,6 +806,7 @@ class ASKS_OT_driver_add(PollSystemEnabled, Operator):
         options=set()
         )
 
+    @event_batch()
     def execute(self, context: 'Context') -> Set[str]:
         node = context.object.data.shape_keys.asks.nodes.get(self.node_target)
 
@@ -907,6 +883,7 @@ class ASKS_OT_combination_variable_add(PollSystemEnabled, Operator):
                                   self, "nodes",
                                   self, "active_index")
 
+    @event_batch()
     def execute(self, context: 'Context') -> Set[str]:
         # TODO handle errors
         key = context.object.data.shape_keys
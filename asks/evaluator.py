@@ -0,0 +1,252 @@
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+from math import pi
+import numpy as np
+from .fcurves import driver_find
+from .utils import aim_vector
+from .nodes import _hierarchy_get, _node_is_analytic
+from .curves import curves_keyframes, easing_evaluate
+if TYPE_CHECKING:
+    from bpy.types import Key
+
+# Iterations used to invert the bezier x(t) of each segment. 40 halvings are
+# below single precision at any range a shape key can have.
+BISECT_ITERATIONS = 40
+
+
+def fcurve_evaluate(keyframes: np.ndarray, x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=float)
+    co = keyframes[:, 0]
+    if len(co) == 1:
+        return np.full_like(x, co[0, 1])
+
+    p0 = co[:-1]
+    p3 = co[1:]
+    d1 = p0 - keyframes[:-1, 2]
+    d2 = p3 - keyframes[1:, 1]
+
+    # Handles overlapping within a segment are scaled down by the same factor
+    # Blender uses (BKE_fcurve_correct_bezpart) so that x(t) is monotonic.
+    span = p3[:, 0] - p0[:, 0]
+    total = np.abs(d1[:, 0]) + np.abs(d2[:, 0])
+    fac = np.where(total > span, span / np.where(total > 0.0, total, 1.0), 1.0)[:, np.newaxis]
+    p1 = p0 - d1 * fac
+    p2 = p3 - d2 * fac
+
+    segment = np.clip(np.searchsorted(co[:, 0], x, side='right') - 1, 0, len(co) - 2)
+    a, b, c, d = p0[segment], p1[segment], p2[segment], p3[segment]
+
+    def bezier(t: np.ndarray, axis: int) -> np.ndarray:
+        s = 1.0 - t
+        return (s*s*s*a[..., axis]
+                + 3.0*s*s*t*b[..., axis]
+                + 3.0*s*t*t*c[..., axis]
+                + t*t*t*d[..., axis])
+
+    lo = np.zeros_like(x)
+    hi = np.ones_like(x)
+    for _ in range(BISECT_ITERATIONS):
+        t = (lo + hi) * 0.5
+        below = bezier(t, 0) < x
+        lo = np.where(below, t, lo)
+        hi = np.where(below, hi, t)
+
+    y = bezier((lo + hi) * 0.5, 1)
+    y = np.where(x <= co[0, 0], co[0, 1], y)
+    return np.where(x >= co[-1, 0], co[-1, 1], y)
+
+
+class GraphEvaluator:
+
+    def __init__(self, key: 'Key') -> None:
+        import bpy
+        hierarchy = _hierarchy_get(key)
+        items = key.asks.nodes.internal__
+        blocks = key.key_blocks
+        count = len(hierarchy)
+
+        self.names: List[str] = list(hierarchy.names)
+        self.positions: Dict[str, int] = dict(hierarchy.positions)
+        self.parents = np.array(hierarchy.parents, dtype=int)
+        self.weights = np.array([key.get(node.identifier, 0.0) for node in items], dtype=float)
+
+        self.values = np.zeros(count)
+        self.slider_min = np.full(count, -np.inf)
+        self.slider_max = np.full(count, np.inf)
+        for index, name in enumerate(self.names):
+            shape = blocks.get(name)
+            if shape:
+                self.values[index] = shape.value
+                self.slider_min[index] = shape.slider_min
+                self.slider_max[index] = shape.slider_max
+
+        self.curves: List[Optional[np.ndarray]] = [None] * count
+        self.easings: Dict[int, Tuple] = {}
+        self.drivers: List[Optional[Tuple]] = [None] * count
+        self.targets: Dict[Tuple[str, str], np.ndarray] = {}
+        dependencies: List[List[int]] = [[] for _ in range(count)]
+
+        # Curves are collected and computed in a single batch at the end
+        curves = []
+        input_ranges = []
+        value_ranges = []
+        slots = []
+
+        for index, node in enumerate(items):
+            if node.depth == 0:
+                continue
+
+            parent = self.parents[index]
+            if items[parent].depth:
+                dependencies[index].append(parent)
+
+            fcurve = driver_find(key, f'key_blocks["{node.name}"].value')
+            if fcurve and not fcurve.mute and _node_is_analytic(node):
+                self.easings[index] = (node.curve.type,
+                                       node.curve.easing,
+                                       (node.input_range_min, node.input_range_max),
+                                       (node.value_range_min, node.value_range_max))
+            elif fcurve and not fcurve.mute:
+                curves.append(node.curve)
+                input_ranges.append((node.input_range_min, node.input_range_max))
+                value_ranges.append((node.value_range_min, node.value_range_max))
+                slots.append((self.curves, index))
+
+            settings = node.driver
+            if settings is None:
+                continue
+            fcurve = driver_find(key, settings.data_path)
+            if fcurve is None or fcurve.mute:
+                continue
+
+            type_ = settings.type
+            if type_ not in {'CONE', 'COMBINATION'}:
+                continue
+
+            curves.append(settings.curve)
+            input_ranges.append((1.0 - settings.radius, 1.0))
+            value_ranges.append((settings.value_range_min, settings.value_range_max))
+            slots.append((self.drivers, index))
+
+            if type_ == 'CONE':
+                target = (settings.data_target, settings.bone_target)
+                if target not in self.targets:
+                    self.targets[target] = _target_rotation(bpy.data.objects.get(target[0]), target[1])
+                # The generated expression bakes the aim vector with 3 decimals
+                aim = np.round(np.array(aim_vector(settings.rotation_quaternion)), 3)
+                self.drivers[index] = ('CONE', target, aim)
+
+            else:
+                inputs = []
+                for variable in fcurve.driver.variables:
+                    position = self.positions.get(variable.targets[0].data_path[12:-8])
+                    if position is not None:
+                        inputs.append(position)
+                dependencies[index].extend(inputs)
+                self.drivers[index] = ('COMBINATION', settings.combination_type, inputs)
+
+        for (slot, index), data in zip(slots, curves_keyframes(curves, input_ranges, value_ranges)):
+            slot[index] = data if slot is self.curves else slot[index] + (data,)
+
+        self.order = _topological_order(dependencies)
+
+    def evaluate(self,
+                 count: Optional[int]=None,
+                 rotations: Optional[Dict[Tuple[str, str], Sequence]]=None,
+                 weights: Optional[Dict[str, Sequence[float]]]=None) -> np.ndarray:
+        # Returns the value of every node as an array of shape (count, nodes).
+        # rotations maps (object, bone) to quaternions of shape (count, 4) and
+        # overrides the targets of CONE drivers. weights maps node names to
+        # weights of shape (count,) and overrides the node's weight driver.
+        # POSE and CUSTOM weights are read from the ID properties unless given.
+        rotations = {target: np.asarray(value, dtype=float) for target, value in (rotations or {}).items()}
+        weights = {self.positions[name]: np.asarray(value, dtype=float) for name, value in (weights or {}).items()}
+
+        if count is None:
+            counts = [len(value) for value in rotations.values() if value.ndim == 2]
+            counts.extend(len(value) for value in weights.values() if value.ndim == 1)
+            count = max(counts, default=1)
+
+        values = np.empty((count, len(self.names)))
+        values[:] = self.values
+
+        for index in self.order:
+            if index == 0:
+                continue
+
+            weight = weights.get(index)
+            if weight is None:
+                driver = self.drivers[index]
+                if driver is None:
+                    weight = np.full(count, self.weights[index])
+                elif driver[0] == 'CONE':
+                    rotation = rotations.get(driver[1], self.targets[driver[1]])
+                    weight = fcurve_evaluate(driver[3], _cone_evaluate(rotation, driver[2]))
+                else:
+                    weight = fcurve_evaluate(driver[3], _combination_evaluate(values, driver[1], driver[2]))
+                # Driven ID properties are clamped to the shape key's slider range
+                weight = np.clip(weight, self.slider_min[index], self.slider_max[index])
+
+            curve = self.curves[index]
+            easing = self.easings.get(index)
+            if curve is None and easing is None:
+                continue
+
+            parent = self.parents[index]
+            x = np.broadcast_to(weight, (count,))
+            if parent:
+                x = x * values[:, parent]
+            value = easing_evaluate(*easing[:2], x, *easing[2:]) if easing else fcurve_evaluate(curve, x)
+            values[:, index] = np.clip(value, self.slider_min[index], self.slider_max[index])
+
+        return values
+
+
+def _target_rotation(ob, bone: str) -> np.ndarray:
+    if ob is None:
+        return np.array((1.0, 0.0, 0.0, 0.0))
+    if ob.type == 'ARMATURE' and bone:
+        pose_bone = ob.pose.bones.get(bone)
+        if pose_bone:
+            return np.array(pose_bone.matrix_basis.to_quaternion())
+    return np.array(ob.matrix_basis.to_quaternion())
+
+
+def _cone_evaluate(rotation: np.ndarray, aim: np.ndarray) -> np.ndarray:
+    w, x, y, z = np.moveaxis(np.atleast_2d(rotation), -1, 0)
+    dot = (2.0*(x*y-w*z)*aim[0]
+           + (1.0-2.0*(x*x+z*z))*aim[1]
+           + 2.0*(y*z+w*x)*aim[2])
+    return (np.arcsin(np.clip(dot, -1.0, 1.0)) + pi/2.0) / pi
+
+
+def _combination_evaluate(values: np.ndarray, mode: str, inputs: Sequence[int]) -> np.ndarray:
+    if not inputs:
+        return np.zeros(len(values))
+    data = values[:, list(inputs)]
+    if mode == 'MULTIPLY':
+        return data.prod(axis=1)
+    if mode == 'MIN':
+        return data.min(axis=1)
+    if mode == 'MAX':
+        return data.max(axis=1)
+    return data.mean(axis=1)
+
+
+def _topological_order(dependencies: Sequence[Sequence[int]]) -> List[int]:
+    count = len(dependencies)
+    pending = [len(set(items)) for items in dependencies]
+    dependents: List[List[int]] = [[] for _ in range(count)]
+    for index, items in enumerate(dependencies):
+        for item in set(items):
+            dependents[item].append(index)
+
+    order = [index for index in range(count) if not pending[index]]
+    for index in order:
+        for dependent in dependents[index]:
+            pending[dependent] -= 1
+            if not pending[dependent]:
+                order.append(dependent)
+
+    if len(order) != count:
+        raise ValueError("GraphEvaluator: combination drivers form a dependency cycle")
+    return order
@@ -1,21 +1,161 @@
 
-from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union, TYPE_CHECKING
+from collections import Counter
+from contextlib import contextmanager
 from sys import modules
 from logging import getLogger
 from bpy.types import PropertyGroup
 from bpy.props import CollectionProperty, StringProperty
+if TYPE_CHECKING:
+    from bpy.types import ID
 
 log = getLogger("asks")
 
+# Handlers resolved from their (module, name) for the session. Cleared when the
+# add-on is registered or unregistered as reloading replaces the modules.
+_handlers: Dict[Tuple[str, str], Callable] = {}
+
+# Dispatch counters ("dispatch:<event type>", "handler_hits", "handler_misses")
+_counters: Counter = Counter()
+
+
+def _handler_resolve(key: Tuple[str, str]) -> Optional[Callable]:
+    handler = _handlers.get(key)
+    if handler is not None:
+        _counters["handler_hits"] += 1
+        return handler
+    _counters["handler_misses"] += 1
+    module = modules.get(key[0])
+    if module:
+        handler = getattr(module, key[1], None)
+        if callable(handler):
+            _handlers[key] = handler
+            return handler
+
+
+def handlers_clear() -> None:
+    _handlers.clear()
+
+
+def event_counters() -> Dict[str, int]:
+    return dict(_counters)
+
+
+def event_counters_clear() -> None:
+    _counters.clear()
+
+
+# Handlers bound to every instance of a class, by class and event type. Only
+# handlers bound to a single instance are stored in its proxies.
+_class_handlers: Dict[type, Dict[str, List[Callable]]] = {}
+_class_handlers_cache: Dict[Tuple[type, str], Tuple[Callable, ...]] = {}
+
+
+def bind_class(cls: type, key: str, handler: Callable) -> None:
+    if not isinstance(key, str):
+        raise TypeError()
+    if not callable(handler):
+        raise TypeError()
+    handlers = _class_handlers.setdefault(cls, {}).setdefault(key, [])
+    if handler not in handlers:
+        handlers.append(handler)
+        _class_handlers_cache.clear()
+
+
+def unbind_class(cls: type, key: str, handler: Callable) -> None:
+    handlers = _class_handlers.get(cls, {}).get(key)
+    if handlers and handler in handlers:
+        handlers.remove(handler)
+        _class_handlers_cache.clear()
+
+
+def _class_handlers_get(cls: type, key: str) -> Tuple[Callable, ...]:
+    # Handlers bound to the class and its bases, most derived first
+    result = _class_handlers_cache.get((cls, key))
+    if result is None:
+        result = []
+        for base in cls.__mro__:
+            handlers = _class_handlers.get(base)
+            if handlers:
+                result.extend(handlers.get(key, ()))
+        result = _class_handlers_cache[(cls, key)] = tuple(result)
+    return result
+
+
+def event_proxies_strip(dispatcher: 'EventDispatcher') -> int:
+    # Removes the proxies of handlers that are bound to the dispatcher's class,
+    # which files saved before class bindings store on every instance.
+    count = 0
+    collection = dispatcher.eventproxies__
+    for index in reversed(range(len(collection))):
+        proxies = collection[index]
+        handlers = _class_handlers_get(type(dispatcher), proxies.name)
+        items = proxies.internal__
+        for item in reversed(range(len(items))):
+            if any(items[item] == handler for handler in handlers):
+                items.remove(item)
+                count += 1
+        if not len(items):
+            collection.remove(index)
+    return count
+
+
+# Events queued while a batch is open and dispatched once per target when the
+# outermost batch closes, with the arguments of the last dispatch. Any other
+# event flushes the queue first, so handlers still see events in order. The
+# queue is dropped if the batch raises.
+BATCHED_EVENTS = frozenset(("updated", "slider_min", "slider_max"))
+
+_batch_depth = 0
+_batch_queue: Dict[Tuple[int, str, str], Tuple['ID', str, str, Tuple[Any], Dict[str, Any]]] = {}
+
+
+@contextmanager
+def event_batch() -> Iterator[None]:
+    global _batch_depth
+    _batch_depth += 1
+    try:
+        yield
+    except BaseException:
+        _batch_depth -= 1
+        if _batch_depth == 0:
+            _batch_queue.clear()
+        raise
+    _batch_depth -= 1
+    if _batch_depth == 0:
+        _batch_flush()
+
+
+def event_batch_flush() -> None:
+    # Targets are queued by path as the python objects of collection items are
+    # invalidated when the collection is resized. Anything that adds, moves or
+    # removes dispatchers must flush the queue first, as their paths change.
+    if _batch_queue:
+        _batch_flush()
+
+
+def _batch_flush() -> None:
+    items = tuple(_batch_queue.values())
+    _batch_queue.clear()
+    for id_, path, key, args, kwargs in items:
+        try:
+            dispatcher = id_.path_resolve(path)
+        except (ReferenceError, ValueError):
+            log.warning(f'Batched event "{key}" target {path} no longer exists')
+            continue
+        dispatcher.dispatch_now(key, *args, **kwargs)
+
+
 class EventProxy(PropertyGroup):
 
     @property
     def handler(self) -> Optional[Callable]:
-        module = modules.get(self.module)
-        if module:
-            handler = getattr(module, self.name, None)
-            if callable(handler):
-                return handler
+        return _handler_resolve(self.key)
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        # Read from the ID properties directly, bypassing the RNA getters
+        return (PropertyGroup.get(self, "module", ""), PropertyGroup.get(self, "name", ""))
 
     module: StringProperty(
         name="Path",
@@ -42,9 +182,13 @@ class EventProxy(PropertyGroup):
 
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, EventProxy):
-            return other.module == self.module and other.name == self.name
+            return other.key == self.key
         elif callable(other):
-            return other.__module__ == self.module and other.__name__ == self.name
+            key = self.key
+            handler = _handlers.get(key)
+            if handler is not None:
+                return handler is other
+            return (getattr(other, "__module__", None), getattr(other, "__name__", None)) == key
         else:
             return False
 
@@ -59,7 +203,7 @@ class EventProxy(PropertyGroup):
             except Exception:
                 log.exception(f'An error occurred during the handling of event "{self.type}"')
         else:
-            log.error(f'Handler for event "{self.type}" not found at {self.module}.{self.name}')
+            log.error(f'Handler for event "{self.type}" not found at {".".join(self.key)}')
 
 
 class EventProxies(PropertyGroup):
@@ -117,6 +261,8 @@ class EventDispatcher:
             raise TypeError()
         if not callable(handler):
             raise TypeError()
+        if handler in _class_handlers_get(type(self), key):
+            return
         proxies = self.eventproxies__.get(key)
         if proxies is None:
             proxies = self.eventproxies__.add()
@@ -133,6 +279,25 @@ class EventDispatcher:
             proxies.remove(handler)
 
     def dispatch(self, key: str, *args: Tuple[Any], **kwargs: Dict[str, Any]) -> None:
+        if _batch_depth:
+            if key in BATCHED_EVENTS:
+                id_ = self.id_data
+                path = self.path_from_id()
+                item = (id_.as_pointer(), path, key)
+                if item in _batch_queue:
+                    _counters["coalesced"] += 1
+                _batch_queue[item] = (id_, path, key, args, kwargs)
+                return
+            _batch_flush()
+        self.dispatch_now(key, *args, **kwargs)
+
+    def dispatch_now(self, key: str, *args: Tuple[Any], **kwargs: Dict[str, Any]) -> None:
+        _counters[f'dispatch:{key}'] += 1
+        for handler in _class_handlers_get(type(self), key):
+            try:
+                handler(self, *args, **kwargs)
+            except Exception:
+                log.exception(f'An error occurred during the handling of event "{key}"')
         proxies = self.eventproxies__.get(key)
         if proxies is not None:
             proxies(self, *args, **kwargs)
@@ -0,0 +1,159 @@
+import ast
+from typing import Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+from .events import log
+if TYPE_CHECKING:
+    from bpy.types import Driver, FCurve, ID
+
+# Functions understood by Blender's simple expression evaluator, mapped to the
+# argument counts it accepts (None for variadic). Anything outside of this set
+# forces the driver onto the Python evaluator.
+SIMPLE_FUNCTIONS: Dict[str, Optional[Tuple[int, ...]]] = {
+    "radians": (1,),
+    "degrees": (1,),
+    "abs": (1,),
+    "fabs": (1,),
+    "floor": (1,),
+    "ceil": (1,),
+    "trunc": (1,),
+    "round": (1,),
+    "int": (1,),
+    "sin": (1,),
+    "cos": (1,),
+    "tan": (1,),
+    "asin": (1,),
+    "acos": (1,),
+    "atan": (1,),
+    "atan2": (2,),
+    "exp": (1,),
+    "log": (1, 2),
+    "sqrt": (1,),
+    "pow": (2,),
+    "fmod": (2,),
+    "lerp": (3,),
+    "clamp": (1, 3),
+    "smoothstep": (3,),
+    "min": None,
+    "max": None,
+    }
+
+SIMPLE_CONSTANTS = frozenset(("pi", "frame"))
+
+# Driver expressions are stored in a fixed size buffer and silently truncated.
+EXPRESSION_MAX_LENGTH = 255
+_SIMPLE_NODES = (ast.Expression,
+                 ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div,
+                 ast.UnaryOp, ast.UAdd, ast.USub, ast.Not,
+                 ast.BoolOp, ast.And, ast.Or,
+                 ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+                 ast.IfExp,
+                 ast.Call,
+                 ast.Name, ast.Load,
+                 ast.Constant)
+
+
+def expression_validate(expression: str, names: Optional[Iterable[str]]=None) -> None:
+    if len(expression) > EXPRESSION_MAX_LENGTH:
+        raise ValueError(f'Invalid driver expression "{expression}": '
+                         f'exceeds {EXPRESSION_MAX_LENGTH} characters')
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as error:
+        raise ValueError(f'Invalid driver expression "{expression}": {error.msg}') from None
+
+    if names is not None:
+        names = SIMPLE_CONSTANTS.union(names)
+
+    for node in ast.walk(tree):
+        if not isinstance(node, _SIMPLE_NODES):
+            raise ValueError(f'Invalid driver expression "{expression}": '
+                             f'{type(node).__name__} is not supported')
+
+        if isinstance(node, ast.Constant):
+            if type(node.value) not in (int, float, bool):
+                raise ValueError(f'Invalid driver expression "{expression}": '
+                                 f'{node.value!r} is not a number')
+
+        elif isinstance(node, ast.Call):
+            func = node.func
+            if not isinstance(func, ast.Name) or func.id not in SIMPLE_FUNCTIONS:
+                raise ValueError(f'Invalid driver expression "{expression}": '
+                                 f'{ast.unparse(func)}() is not supported')
+            if node.keywords:
+                raise ValueError(f'Invalid driver expression "{expression}": '
+                                 f'{func.id}() does not accept keyword arguments')
+            arity = SIMPLE_FUNCTIONS[func.id]
+            count = len(node.args)
+            if (count == 0) if arity is None else (count not in arity):
+                raise ValueError(f'Invalid driver expression "{expression}": '
+                                 f'{func.id}() does not accept {count} arguments')
+
+        elif isinstance(node, ast.Name) and names is not None:
+            if node.id not in names and node.id not in SIMPLE_FUNCTIONS:
+                raise ValueError(f'Invalid driver expression "{expression}": '
+                                 f'{node.id} is not a driver variable')
+
+
+def expression_set(driver: 'Driver', expression: str) -> None:
+    expression_validate(expression, driver.variables.keys())
+    if driver.type != 'SCRIPTED':
+        driver.type = 'SCRIPTED'
+    if driver.use_self:
+        driver.use_self = False
+    if driver.expression != expression:
+        driver.expression = expression
+    if not driver.is_simple_expression:
+        log.warning(f'Driver expression "{expression}" requires the Python evaluator')
+
+
+def expression_product(terms: Iterable[str]) -> str:
+    terms = tuple(terms)
+    return "*".join(terms) if terms else "0.0"
+
+
+def expression_min(terms: Iterable[str]) -> str:
+    terms = tuple(terms)
+    if len(terms) > 1:
+        return f'min({",".join(terms)})'
+    return terms[0] if terms else "0.0"
+
+
+def expression_max(terms: Iterable[str]) -> str:
+    terms = tuple(terms)
+    if len(terms) > 1:
+        return f'max({",".join(terms)})'
+    return terms[0] if terms else "0.0"
+
+
+def expression_mean(terms: Iterable[str]) -> str:
+    terms = tuple(terms)
+    if len(terms) > 1:
+        return f'({"+".join(terms)})/{float(len(terms))}'
+    return terms[0] if terms else "0.0"
+
+
+def expression_clamp(term: str, minimum: float=0.0, maximum: float=1.0) -> str:
+    return f'min({expression_number(maximum)},max({expression_number(minimum)},{term}))'
+
+
+def expression_easing(easing: str, exponent: float, term: str) -> str:
+    # Power easing of a term within 0.0-1.0
+    n = expression_number(exponent)
+    if easing == 'EASE_IN':
+        return f'pow({term},{n})'
+    if easing == 'EASE_OUT':
+        return f'(1.0-pow(1.0-{term},{n}))'
+    return f'(pow(2.0*min({term},0.5),{n})+1.0-pow(2.0-2.0*max({term},0.5),{n}))/2.0'
+
+
+def expression_number(value: float) -> str:
+    # Fixed notation as exponents are not understood by the simple evaluator
+    text = f'{value:.6f}'.rstrip("0")
+    return f'{text}0' if text.endswith(".") else text
+
+
+def python_drivers(id_: 'ID') -> List['FCurve']:
+    animdata = id_.animation_data
+    if animdata is None:
+        return []
+    return [fcurve for fcurve in animdata.drivers
+            if fcurve.driver.type == 'SCRIPTED' and not fcurve.driver.is_simple_expression]
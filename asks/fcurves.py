@@ -0,0 +1,107 @@
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from bpy.types import AnimDataDrivers, FCurve, ID
+
+
+class DriverIndex:
+
+    # Positions in the driver list rather than the F-curves themselves, as the
+    # python objects of removed F-curves must never be accessed again.
+    def __init__(self, drivers: 'AnimDataDrivers') -> None:
+        self.count = len(drivers)
+        self.positions: Dict[Tuple[str, int], int] = {}
+        for position, fcurve in enumerate(drivers):
+            self.positions.setdefault((fcurve.data_path, fcurve.array_index), position)
+
+
+_indices: Dict[int, DriverIndex] = {}
+
+
+def _index_get(id_: 'ID', drivers: 'AnimDataDrivers', rebuild: Optional[bool]=False) -> DriverIndex:
+    pointer = id_.as_pointer()
+    index = _indices.get(pointer)
+    if rebuild or index is None or index.count != len(drivers):
+        index = DriverIndex(drivers)
+        _indices[pointer] = index
+    return index
+
+
+def _index_lookup(index: DriverIndex,
+                  drivers: 'AnimDataDrivers',
+                  data_path: str,
+                  array_index: int) -> Optional['FCurve']:
+    position = index.positions.get((data_path, array_index))
+    if position is not None and position < len(drivers):
+        fcurve = drivers[position]
+        if fcurve.data_path == data_path and fcurve.array_index == array_index:
+            return fcurve
+
+
+def driver_find(id_: 'ID', data_path: str, array_index: int=0) -> Optional['FCurve']:
+    animdata = id_.animation_data
+    if animdata is None:
+        return None
+
+    drivers = animdata.drivers
+    key = (data_path, array_index)
+    index = _index_get(id_, drivers)
+
+    # Hits are confirmed against the F-curve at the indexed position, as other
+    # tools, renames and undo can change the drivers without changing the count.
+    if key in index.positions:
+        fcurve = _index_lookup(index, drivers, data_path, array_index)
+        if fcurve is not None:
+            return fcurve
+        index = _index_get(id_, drivers, True)
+        return _index_lookup(index, drivers, data_path, array_index)
+
+    # A miss is confirmed against the driver list for the same reason
+    fcurve = drivers.find(data_path, index=array_index)
+    if fcurve is not None:
+        _index_get(id_, drivers, True)
+    return fcurve
+
+
+def driver_ensure(id_: 'ID', data_path: str, array_index: int=0) -> 'FCurve':
+    fcurve = driver_find(id_, data_path, array_index)
+    if fcurve is None:
+        drivers = id_.animation_data_create().drivers
+        fcurve = drivers.new(data_path, index=array_index)
+        index = _indices.get(id_.as_pointer())
+        if index is not None:
+            # New drivers are appended to the list
+            index.positions[(data_path, array_index)] = index.count
+            index.count += 1
+    return fcurve
+
+
+def driver_remove(id_: 'ID', fcurve: 'FCurve') -> None:
+    animdata = id_.animation_data
+    if animdata is not None:
+        index = _indices.get(id_.as_pointer())
+        if index is not None:
+            position = index.positions.pop((fcurve.data_path, fcurve.array_index), None)
+            if position is not None:
+                index.count -= 1
+                positions = index.positions
+                for item, value in positions.items():
+                    if value > position:
+                        positions[item] = value - 1
+            else:
+                del _indices[id_.as_pointer()]
+        animdata.drivers.remove(fcurve)
+
+
+def driver_rename(id_: 'ID', data_path: str, new_path: str) -> None:
+    index = _indices.get(id_.as_pointer())
+    if index is not None:
+        positions = index.positions
+        for array_index in [item[1] for item in positions if item[0] == data_path]:
+            positions[(new_path, array_index)] = positions.pop((data_path, array_index))
+
+
+def drivers_invalidate(id_: Optional['ID']=None) -> None:
+    if id_ is None:
+        _indices.clear()
+    else:
+        _indices.pop(id_.as_pointer(), None)
@@ -1,8 +1,10 @@
 
 from typing import Iterator, TYPE_CHECKING, List, Optional, Set, Tuple, Union
+from uuid import uuid4
 from bpy.types import Operator, PropertyGroup
 from bpy.props import CollectionProperty, StringProperty
 from .utils import PollSystemEnabled
+from .events import event_batch
 if TYPE_CHECKING:
     from bpy.types import Context
     from .nodes import Node
@@ -29,6 +31,12 @@ def name_set(group: 'NodeGroup', name: str) -> None:
 
 class NodeGroup(PropertyGroup):
 
+    identifier: StringProperty(
+        name="Identifier",
+        get=lambda self: self.get("identifier", ""),
+        options=set()
+        )
+
     name: StringProperty(
         name="Name",
         get=name_get,
@@ -41,6 +49,7 @@ class NodeGroup(PropertyGroup):
         return filter(lambda node: node.group == name, self.id_data.asks.nodes)
 
     def __init__(self, name: Optional[str]="Group") -> None:
+        self["identifier"] = f'asks_group_{uuid4().hex}'
         self.name = name
 
 
@@ -87,6 +96,7 @@ class ASKS_OT_group_add(PollSystemEnabled, Operator):
         options=set()
         )
 
+    @event_batch()
     def execute(self, context: 'Context') -> Set[str]:
         context.object.data.shape_keys.asks.groups.internal__.add().__init__(self.name)
         return {'FINISHED'}
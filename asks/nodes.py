@@ -1,6 +1,8 @@
 
-from typing import Dict, Callable, Iterator, List, Optional, Set, Union, TYPE_CHECKING
+from typing import Dict, Callable, Iterator, List, Optional, Sequence, Set, Union, TYPE_CHECKING
 from uuid import uuid4
+from fnmatch import fnmatchcase
+import numpy as np
 from bpy.types import Operator, Panel, PropertyGroup, ShapeKey
 from bpy.props import (BoolProperty,
                        CollectionProperty,
@@ -11,12 +13,167 @@ from bpy.props import (BoolProperty,
 from bpy import msgbus
 from .config import POPUP_WIDTH
 from .utils import PollActiveChildNode, PollActiveNode, PollSystemEnabled, split_layout
-from .events import EventDispatcher
-from .curves import Curve, draw_curve
+from .events import EventDispatcher, bind_class, event_batch, event_batch_flush
+from .fcurves import driver_ensure, driver_find, driver_remove, driver_rename
+from .expressions import EXPRESSION_MAX_LENGTH, expression_easing, expression_number, expression_set
+from .curves import (EASING_TOLERANCE,
+                     Curve,
+                     assign_keyframes,
+                     draw_curve,
+                     easing_deviation,
+                     easing_exponent)
 from .drivers import WeightDriver
 from .groups import NodeGroup
+from .poses import pose_group_clear, pose_group_update, pose_props_clear
 if TYPE_CHECKING:
-    from bpy.types import Context, Event, FCurve, Object, UILayout
+    from bpy.types import Context, Driver, Event, FCurve, Key, Object, UILayout
+
+#region Hierarchy
+#--------------------------------------------------------------------------------------------------
+
+class NodeHierarchy:
+
+    def __init__(self, key: 'Key') -> None:
+        nodes = key.asks.nodes.internal__
+        count = len(nodes)
+        names = nodes.keys()
+        depths = [0] * count
+        nodes.foreach_get("depth", depths)
+        expanded = [False] * count
+        nodes.foreach_get("show_expanded", expanded)
+
+        parents = [-1] * count
+        children = [[] for _ in range(count)]
+        ends = [count] * count
+        stack = []
+
+        for index, depth in enumerate(depths):
+            while stack and depths[stack[-1]] >= depth:
+                ends[stack.pop()] = index
+            if stack:
+                parent = stack[-1]
+                parents[index] = parent
+                children[parent].append(index)
+            stack.append(index)
+
+        self.names = names
+        self.depths = depths
+        self.parents = parents
+        self.children = children
+        self.ends = ends
+        self.expanded = expanded
+        self.positions = {name: index for index, name in enumerate(names)}
+        self._visible = None
+        self._folded = None
+        self._matches = {}
+        self._filter = None
+        self._filter_key = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def subtree(self, index: int) -> range:
+        return range(index, self.ends[index])
+
+    @property
+    def visible(self) -> List[bool]:
+        # Parents always precede their descendants, so a node is visible if its
+        # parent is both visible and expanded.
+        visible = self._visible
+        if visible is None:
+            parents = self.parents
+            expanded = self.expanded
+            visible = [True] * len(parents)
+            for index, parent in enumerate(parents):
+                if parent != -1:
+                    visible[index] = visible[parent] and expanded[parent]
+            self._visible = visible
+        return visible
+
+    def expand(self, index: int, value: bool) -> None:
+        self.expanded[index] = value
+        visible = self._visible
+        if visible is not None:
+            parents = self.parents
+            expanded = self.expanded
+            for child in range(index + 1, self.ends[index]):
+                parent = parents[child]
+                visible[child] = visible[parent] and expanded[parent]
+        self._filter_key = None
+
+    def match(self, pattern: str) -> List[int]:
+        # Positions of the names containing pattern, cached per pattern for as
+        # long as the index is kept. Typing a filter only ever extends it, so a
+        # pattern without wildcards is tested against the matches of the longest
+        # cached pattern it contains rather than against every name.
+        pattern = pattern.lower()
+        matches = self._matches.get(pattern)
+        if matches is not None:
+            return matches
+
+        folded = self._folded
+        if folded is None:
+            folded = self._folded = [name.lower() for name in self.names]
+
+        if any(char in pattern for char in "*?["):
+            wildcard = f'*{pattern}*'
+            matches = [index for index, name in enumerate(folded) if fnmatchcase(name, wildcard)]
+        else:
+            candidates = None
+            length = -1
+            for cached, indices in self._matches.items():
+                if len(cached) > length and cached in pattern and not any(char in cached for char in "*?["):
+                    candidates = indices
+                    length = len(cached)
+            if candidates is None:
+                candidates = range(len(folded))
+            matches = [index for index in candidates if pattern in folded[index]]
+
+        self._matches[pattern] = matches
+        return matches
+
+    def search(self, pattern: str) -> List[bool]:
+        result = [False] * len(self.names)
+        for index in self.match(pattern):
+            result[index] = True
+        # Keep the ancestors of every match so results are shown in context.
+        parents = self.parents
+        for index in reversed(range(len(result))):
+            if result[index]:
+                parent = parents[index]
+                if parent != -1:
+                    result[parent] = True
+        return result
+
+    def filter(self, flag: int, pattern: Optional[str]="") -> List[int]:
+        # The list inverts the returned flags itself when its filter is inverted
+        cachekey = (flag, pattern)
+        if self._filter_key != cachekey:
+            mask = self.search(pattern) if pattern else self.visible
+            self._filter = [flag if x else 0 for x in mask]
+            self._filter_key = cachekey
+        return self._filter
+
+
+_hierarchies: Dict[int, NodeHierarchy] = {}
+
+
+def _hierarchy_get(key: 'Key') -> NodeHierarchy:
+    pointer = key.as_pointer()
+    hierarchy = _hierarchies.get(pointer)
+    if hierarchy is None or len(hierarchy) != len(key.asks.nodes.internal__):
+        hierarchy = NodeHierarchy(key)
+        _hierarchies[pointer] = hierarchy
+    return hierarchy
+
+
+def _hierarchy_invalidate(key: Optional['Key']=None) -> None:
+    if key is None:
+        _hierarchies.clear()
+    else:
+        _hierarchies.pop(key.as_pointer(), None)
+
+#endregion Hierarchy
 
 #region Iterators
 #--------------------------------------------------------------------------------------------------
@@ -25,66 +182,61 @@ class NodeIterator:
 
     def __init__(self, root: 'Node') -> None:
         self._root = root
+        self._hierarchy = None
+        self._indices = ()
 
     def __contains__(self, node: 'Node') -> bool:
-        return any(x == node for x in self)
+        if not isinstance(node, Node) or node.id_data != self._root.id_data:
+            return False
+        indices = self.indices
+        return self._hierarchy.positions.get(node.name, -1) in indices
 
     def __getitem__(self, key: Union[int, slice]) -> Union['Node', List['Node']]:
+        nodes = self._root.id_data.asks.nodes.internal__
         if isinstance(key, int):
-            if key < 0:
-                nodes = list(self)
-                key = len(nodes) + key
-                if key < 0:
-                    raise IndexError(f'{type(self)}[key]: integer key out of range')
-            else:
-                nodes = self
-            for index, node in enumerate(nodes):
-                if index == key:
-                    return node
-            raise IndexError(f'{type(self)}[key]: integer key out of range')
+            try:
+                index = self.indices[key]
+            except IndexError:
+                raise IndexError(f'{type(self)}[key]: integer key out of range')
+            return nodes[index]
         elif isinstance(key, slice):
-            return list(self)[key]
+            return [nodes[index] for index in self.indices[key]]
         else:
             raise TypeError(f'{type(self)}[key]: key must be int or slice, not {type(key)}')
 
     def __len__(self) -> int:
-        return sum(1 for _ in self)
+        return len(self.indices)
 
     def __iter__(self) -> Iterator['Node']:
+        nodes = self._root.id_data.asks.nodes.internal__
+        for index in self.indices:
+            yield nodes[index]
+
+    @property
+    def indices(self) -> Sequence[int]:
+        # The view is materialized from the hierarchy index and kept for as
+        # long as that index is, i.e. until the node collection changes.
+        hierarchy = _hierarchy_get(self._root.id_data)
+        if hierarchy is not self._hierarchy:
+            self._hierarchy = hierarchy
+            index = hierarchy.positions.get(self._root.name, -1)
+            self._indices = () if index == -1 else self._indices_get(hierarchy, index)
+        return self._indices
+
+    def _indices_get(self, hierarchy: NodeHierarchy, index: int) -> Sequence[int]:
         raise NotImplementedError()
 
 
 class NodeSubtree(NodeIterator):
 
-    def __iter__(self) -> Iterator['Node']:
-        root = self._root
-        nodes = root.id_data.asks.nodes.internal__
-        depth = root.depth
-        index = nodes.find(root.name) + 1
-        limit = len(nodes)
-        yield root
-        while index < limit:
-            node = nodes[index]
-            if node.depth <= depth: break
-            yield node
-            index += 1
+    def _indices_get(self, hierarchy: NodeHierarchy, index: int) -> Sequence[int]:
+        return hierarchy.subtree(index)
 
 
 class NodeChildren(NodeIterator):
 
-    def __iter__(self) -> Iterator['Node']:
-        root = self._root
-        nodes = root.id_data.asks.nodes.internal__
-        depth = root.depth
-        index = nodes.find(root.name) + 1
-        limit = len(nodes)
-        yield root
-        while index < limit:
-            node = nodes[index]
-            node_depth = node.depth
-            if node_depth <= depth: break
-            if node_depth == depth + 1: yield node
-            index += 1
+    def _indices_get(self, hierarchy: NodeHierarchy, index: int) -> Sequence[int]:
+        return hierarchy.children[index]
 
     def add(self, key: ShapeKey, **handlers: Dict[str, Callable]) -> 'Node':
         if not isinstance(key, ShapeKey):
@@ -94,32 +246,188 @@ class NodeChildren(NodeIterator):
         if key.id_data != root.id_data:
             raise ValueError(f'NodeChildren.add(key): key not recognized')
 
-        nodes = root.id_data.asks.nodes.internal__
-        if key.name in nodes:
+        hierarchy = _hierarchy_get(root.id_data)
+        if key.name in hierarchy.positions:
             raise ValueError(f'NodeChildren.add(key): key already exists')
 
-        index = root.subtree[-1].index + 1
+        event_batch_flush()
+        nodes = root.id_data.asks.nodes.internal__
+        origin = hierarchy.positions[root.name]
+        index = hierarchy.ends[origin]
         nodes.add()
         nodes.move(len(nodes)-1, index)
+        _hierarchy_invalidate(root.id_data)
+        root = nodes[origin]
         node = nodes[index]
         node.__init__(key, root, handlers)
         return node
 
+    @event_batch()
+    def add_many(self,
+                 keys: Sequence[ShapeKey],
+                 progress: Optional[Callable[[int, int], None]]=None,
+                 **handlers: Dict[str, Callable]) -> List['Node']:
+        root = self._root
+        hierarchy = _hierarchy_get(root.id_data)
+        names = set()
+
+        for key in keys:
+            if not isinstance(key, ShapeKey):
+                raise TypeError(f'NodeChildren.add_many(keys): key must be Shapekey, not {type(key)}')
+            if key.id_data != root.id_data:
+                raise ValueError('NodeChildren.add_many(keys): key not recognized')
+            if key.name in hierarchy.positions or key.name in names:
+                raise ValueError(f'NodeChildren.add_many(keys): key "{key.name}" already exists')
+            names.add(key.name)
+
+        count = len(keys)
+        if not count:
+            return []
+
+        event_batch_flush()
+        id_ = root.id_data
+        nodes = id_.asks.nodes.internal__
+        origin = hierarchy.positions[root.name]
+        index = hierarchy.ends[origin]
+        for _ in range(count):
+            nodes.add()
+
+        # New items are appended as a block, so they only need moving when the
+        # parent's subtree does not already end the collection.
+        limit = len(nodes) - count
+        if index < limit:
+            for offset in range(count):
+                nodes.move(limit + offset, index + offset)
+
+        # Adding to the collection may reallocate it, so the parent is fetched
+        # again. Its position is unchanged as new items are inserted after it.
+        root = nodes[origin]
+        depth = root.depth + 1
+        for offset, key in enumerate(keys):
+            node = nodes[index + offset]
+            node["name"] = key.name
+            node["depth"] = depth
+        _hierarchy_invalidate(id_)
+        result = []
+
+        for offset, key in enumerate(keys):
+            fcurve = driver_ensure(id_, f'key_blocks["{key.name}"].value')
+            node = nodes[index + offset]
+            node.__init__(key, root, handlers, fcurve)
+            result.append(node)
+            if progress:
+                progress(offset + 1, count)
+
+        return result
+
+    @event_batch()
     def move(self, node: 'Node', index: int) -> None:
-        pass
+        if not isinstance(node, Node):
+            raise TypeError(f'NodeChildren.move(node, index): node must be Node, not {type(node)}')
+        if not isinstance(index, int):
+            raise TypeError(f'NodeChildren.move(node, index): index must be int, not {type(index)}')
+
+        root = self._root
+        key = root.id_data
+        if node.id_data != key:
+            raise ValueError('NodeChildren.move(node, index): node not recognized')
+
+        hierarchy = _hierarchy_get(key)
+        origin = hierarchy.positions[root.name]
+        source = hierarchy.positions[node.name]
+        if source == 0:
+            raise ValueError('NodeChildren.move(node, index): cannot move the basis node')
+        if origin in hierarchy.subtree(source):
+            raise ValueError(f'NodeChildren.move(node, index): cannot move {node} into its own subtree')
+
+        siblings = [x for x in hierarchy.children[origin] if x != source]
+        count = len(siblings)
+        index = max(0, count + index) if index < 0 else min(index, count)
+        target = siblings[index] if index < count else hierarchy.ends[origin]
+
+        event_batch_flush()
+        nodes = key.asks.nodes
+        items = nodes.internal__
+        active = nodes.active
+        active = active.name if active else ""
+        parent = hierarchy.parents[source]
+        previous = hierarchy.names[parent]
+        end = hierarchy.ends[source]
+        size = end - source
+
+        # Move the subtree as a block. Moving an item only shifts the items
+        # between its old and new positions, so the rest of the block stays put.
+        if target < source:
+            for offset in range(size):
+                items.move(source + offset, target + offset)
+            start = target
+        elif target > end:
+            for _ in range(size):
+                items.move(source, target - 1)
+            start = target - size
+        else:
+            start = source
+
+        delta = root.depth + 1 - hierarchy.depths[source]
+        if delta:
+            for offset, depth in enumerate(hierarchy.depths[source:end]):
+                items[start + offset]["depth"] = depth + delta
+
+        _hierarchy_invalidate(key)
+
+        if active:
+            nodes["active_index"] = _hierarchy_get(key).positions.get(active, 0)
+
+        if parent != origin:
+            node = items[start]
+            shape = node.shape_key
+            if shape and shape.relative_key.name == previous:
+                shape.relative_key = root.shape_key or key.reference_key
+            # Descendants still read their parents by name, so only the moved
+            # node's input needs to point at its new parent unless the drivers
+            # inline their ancestors.
+            _driver_input_update(node, root)
+            _driver_descendants_update(node)
 
     # N.B. does not remove shape keys
+    @event_batch()
     def remove(self, node: 'Node') -> None:
         if not isinstance(node, Node):
             raise TypeError(f'NodeChildren.remove(node): node must be Node, not {type(node)}')
         root = self._root
         if node.parent != root:
             raise TypeError(f'NodeChildren.remove(node): node is not a child of {root}')
-        nodes = root.id_data.asks.nodes.internal__
-        for node in reversed(list(node.subtree)):
-            node.__dispose__()
-            nodes.remove(node.index)
-        
+
+        event_batch_flush()
+        key = root.id_data
+        subtree = node.subtree.indices
+        nodes = key.asks.nodes
+        items = nodes.internal__
+
+        groups = set()
+        for index in subtree:
+            item = items[index]
+            if item.group and item.driver and item.driver.type == 'POSE':
+                groups.add(item.group)
+            item.__dispose__()
+
+        # Events of the disposed items are delivered while they still exist
+        event_batch_flush()
+
+        # Removing from the back of the block means no item of the block is
+        # shifted, only the items that follow the subtree.
+        for index in reversed(subtree):
+            items.remove(index)
+        _hierarchy_invalidate(key)
+
+        for name in groups:
+            group = key.asks.groups.get(name)
+            if group:
+                pose_group_update(group)
+
+        if nodes.get_active_index() >= len(items):
+            nodes.active_index = len(items) - 1
+
 #endregion Iterators
 
 #region Messages
@@ -131,7 +439,9 @@ _objects: Dict[str, object] = {}
 def _shape_key_name_update_handler(shape: ShapeKey) -> None:
     node: Optional[Node] = shape.id_data.asks.nodes.get(shape)
     if node and node.name != shape.name:
+        driver_rename(node.id_data, f'key_blocks["{node.name}"].value', f'key_blocks["{shape.name}"].value')
         node["name"] = shape.name
+        _hierarchy_invalidate(node.id_data)
         node.dispatch("name", node.name)
 
 
@@ -140,6 +450,7 @@ def _shape_key_slider_min_update_handler(key: ShapeKey) -> None:
     if node:
         value = key.slider_min
         node.id_data.id_properties_ui(node.identifier).update(min=value, soft_min=value)
+        _driver_descendants_update(node)
         node.dispatch("slider_min", value)
 
 
@@ -148,6 +459,7 @@ def _shape_key_slider_max_update_handler(key: ShapeKey) -> None:
     if node:
         value = key.slider_max
         node.id_data.id_properties_ui(node.identifier).update(max=value, soft_max=value)
+        _driver_descendants_update(node)
         node.dispatch("slider_max", value)
 
 
@@ -163,13 +475,23 @@ _message_handlers: Dict[str, Callable[[ShapeKey], None]] = {
 #--------------------------------------------------------------------------------------------------
 
 def _curve_update_handler(curve: 'Curve') -> None:
-    _fcurve_update(curve.id_data.path_resolve(curve.path_from_id().rpartition(".")[0]))
+    node = curve.id_data.path_resolve(curve.path_from_id().rpartition(".")[0])
+    if isinstance(node, Node) and node.depth:
+        _node_curve_update(node)
+
+
+def _node_curve_update(node: 'Node') -> None:
+    _fcurve_update(node)
+    if not _node_is_analytic(node):
+        _driver_input_update(node, node.parent)
+    _driver_descendants_update(node)
 
 
 def _group_get(node: 'Node') -> str:
     return node.get("group", "")
 
 
+@event_batch()
 def _group_set(node: 'Node', value: str) -> None:
     groups = node.id_data.asks.groups
     if value not in groups:
@@ -177,11 +499,17 @@ def _group_set(node: 'Node', value: str) -> None:
     prev = _group_get(node)
     if value != prev:
         node["group"] = value
+        pose_props_clear(node)
         if prev:
             group = groups.get(prev)
-            if group and not len(tuple(group.nodes())):
-                groups = groups.internal__
-                groups.remove(groups.find(prev))
+            if group:
+                if not len(tuple(group.nodes())):
+                    pose_group_clear(group)
+                    groups = groups.internal__
+                    groups.remove(groups.find(prev))
+                else:
+                    pose_group_update(group)
+        pose_group_update(node.id_data.asks.groups[value])
         node.dispatch("grouped", value)
 
 
@@ -192,6 +520,7 @@ def _input_range_min_get(node: 'Node') -> float:
 def _input_range_min_set(node: 'Node', value: float) -> None:
     node["input_range_min"] = min(value, node.input_range_max - 0.001)
     _fcurve_update(node)
+    _driver_descendants_update(node)
 
 
 def _input_range_max_get(node: 'Node') -> float:
@@ -201,18 +530,33 @@ def _input_range_max_get(node: 'Node') -> float:
 def _input_range_max_set(node: 'Node', value: float) -> None:
     node["input_range_max"] = max(value, node.input_range_min + 0.001)
     _fcurve_update(node)
+    _driver_descendants_update(node)
+
+
+def _show_expanded_update_handler(node: 'Node', _: 'Context') -> None:
+    hierarchy = _hierarchies.get(node.id_data.as_pointer())
+    if hierarchy is not None:
+        index = hierarchy.positions.get(node.name, -1)
+        if index != -1:
+            hierarchy.expand(index, node.show_expanded)
 
 
 def _is_interpolated_get(node: 'Node') -> bool:
-    animdata = node.id_data.animation_data
-    if animdata:
-        fcurve = animdata.drivers.find(f'key_blocks["{node.name}"].value')
-        return fcurve is not None and not fcurve.mute
-    return False
+    fcurve = driver_find(node.id_data, f'key_blocks["{node.name}"].value')
+    return fcurve is not None and not fcurve.mute
 
 
 def _is_interpolated_set(node: 'Node', value: bool) -> None:
     _fcurve_ensure(node).mute = not value
+    _driver_descendants_update(node)
+
+
+def _use_analytic_easing_set(node: 'Node', value: bool) -> None:
+    value = bool(value)
+    if value != node.use_analytic_easing:
+        node["use_analytic_easing"] = value
+        if node.depth:
+            _node_curve_update(node)
 
 
 def _value_range_min_get(node: 'Node') -> float:
@@ -222,6 +566,7 @@ def _value_range_min_get(node: 'Node') -> float:
 def _value_range_min_set(node: 'Node', value: float) -> None:
     node["value_range_min"] = min(value, node.value_range_max - 0.001)
     _fcurve_update(node)
+    _driver_descendants_update(node)
 
 
 def _value_range_max_get(node: 'Node') -> float:
@@ -231,29 +576,36 @@ def _value_range_max_get(node: 'Node') -> float:
 def _value_range_max_set(node: 'Node', value: float) -> None:
     node["value_range_max"] = max(value, node.value_range_min + 0.001)
     _fcurve_update(node)
+    _driver_descendants_update(node)
 
 
 def _fcurve_ensure(node: 'Node') -> 'FCurve':
-    animdata = node.id_data.animation_data_create()
-    datapath = f'key_blocks["{node.name}"].value'
-    return animdata.drivers.find(datapath) or animdata.drivers.new(datapath)
+    return driver_ensure(node.id_data, f'key_blocks["{node.name}"].value')
 
 
-def _fcurve_update(node: 'Node') -> None:
-    node.curve.assign(_fcurve_ensure(node),
-                      (node.input_range_min, node.input_range_max),
-                      (node.value_range_min, node.value_range_max))
+_NO_KEYFRAMES = np.empty((0, 3, 2))
 
 
-def _driver_update(node: 'Node') -> None:
+def _fcurve_update(node: 'Node', fcurve: Optional['FCurve']=None) -> None:
+    fcurve = fcurve or _fcurve_ensure(node)
+    if _node_is_analytic(node):
+        # The curve is evaluated by the driver expression
+        assign_keyframes(fcurve, _NO_KEYFRAMES)
+        _driver_input_update(node, node.parent, fcurve)
+    else:
+        node.curve.assign(fcurve,
+                          (node.input_range_min, node.input_range_max),
+                          (node.value_range_min, node.value_range_max))
+
+
+def _driver_update(node: 'Node',
+                   parent: Optional['Node']=None,
+                   fcurve: Optional['FCurve']=None) -> None:
 
     if node.depth == 0:
         return
 
-    driver = _fcurve_ensure(node).driver
-    driver.type = 'SCRIPTED'
-    driver.expression = "value"
-
+    driver = (fcurve or _fcurve_ensure(node)).driver
     variables = driver.variables
     for variable in reversed(list(variables)):
         variables.remove(variable)
@@ -267,18 +619,157 @@ def _driver_update(node: 'Node') -> None:
     target.id = node.id_data
     target.data_path = f'["{node.identifier}"]'
 
-    parent = node.parent
+    expression_set(driver, "value")
+
+    _driver_input_update(node, parent or node.parent, fcurve)
+
+
+def _driver_input_update(node: 'Node',
+                         parent: Optional['Node'],
+                         fcurve: Optional['FCurve']=None) -> None:
+
+    if node.depth == 0:
+        return
+
+    driver = (fcurve or _fcurve_ensure(node)).driver
+    if node.id_data.asks.use_flattened_drivers:
+        _driver_flattened_update(node, parent, driver)
+        return
+
+    variables = driver.variables
+    for variable in reversed(list(variables)):
+        if variable.name not in {"value", "input"}:
+            variables.remove(variable)
+
+    variable = variables.get("input")
     if parent and parent.depth:
-        variable = variables.new()
-        variable.type = 'SINGLE_PROP'
-        variable.name = "input"
+        if variable is None:
+            variable = variables.new()
+            variable.type = 'SINGLE_PROP'
+            variable.name = "input"
+
+            target = variable.targets[0]
+            target.id_type = 'KEY'
+            target.id = node.id_data
+
+        variable.targets[0].data_path = f'key_blocks["{parent.name}"].value'
+        expression_set(driver, _node_value_expression(node, "input"))
+
+    else:
+        if variable is not None:
+            variables.remove(variable)
+        expression_set(driver, _node_value_expression(node, None))
+
+
+def _node_is_analytic(node: 'Node') -> bool:
+    return node.use_analytic_easing and node.curve.type != 'CUSTOM'
+
+
+def _node_is_inlinable(node: 'Node') -> bool:
+    return node.is_interpolated and (node.curve.type == 'LINEAR' or _node_is_analytic(node))
+
+
+def _node_value_expression(node: 'Node', input_: Optional[str]) -> str:
+    # Expression of the node's own driver. Nodes using analytic easing evaluate
+    # their curve here as their fcurve has no keyframes.
+    if _node_is_analytic(node):
+        return _node_expression_format(node, input_, "value", slider=False)
+    return "value" if input_ is None else f'{input_}*value'
+
+
+def _node_expression_format(node: 'Node',
+                            input_: Optional[str],
+                            weight: str,
+                            slider: Optional[bool]=True) -> str:
+    # Returns an expression for the node's shape key value. Only valid for
+    # nodes whose curve can be inlined (see _node_is_inlinable).
+    value = weight if input_ is None else f'{input_}*{weight}'
+
+    a, b = node.input_range_min, node.input_range_max
+    if a != 0.0:
+        value = f'({value}-{expression_number(a)})' if a > 0.0 else f'({value}+{expression_number(-a)})'
+    if b - a != 1.0:
+        value = f'{value}*{expression_number(1.0 / (b - a))}'
+    value = f'min(max({value},0.0),1.0)'
+
+    curve = node.curve
+    if curve.type != 'LINEAR':
+        value = expression_easing(curve.easing, easing_exponent(curve.type, curve.easing), value)
+
+    a, b = node.value_range_min, node.value_range_max
+    if b - a != 1.0:
+        value = f'{value}*{expression_number(b - a)}'
+    if a != 0.0:
+        value = f'({value}+{expression_number(a)})' if a > 0.0 else f'({value}-{expression_number(-a)})'
+
+    # Driven values are clamped to the slider range when written to the shape key
+    shape = node.shape_key if slider else None
+    if shape and (a < shape.slider_min or b > shape.slider_max):
+        value = (f'min(max({value},{expression_number(shape.slider_min)}),'
+                 f'{expression_number(shape.slider_max)})')
+
+    return value
+
+
+def _driver_flattened_update(node: 'Node', parent: Optional['Node'], driver: 'Driver') -> None:
+    ancestors = []
+    while parent and parent.depth:
+        ancestors.append(parent)
+        parent = parent.parent
+    ancestors.reverse()
+
+    # Ancestors that can not be inlined are read from their shape key, so only
+    # the ancestors below the nearest of them are inlined.
+    start = 0
+    for index, ancestor in enumerate(ancestors):
+        if not _node_is_inlinable(ancestor):
+            start = index + 1
+
+    while True:
+        value = None if start == 0 else "input"
+        for index in range(start, len(ancestors)):
+            value = _node_expression_format(ancestors[index], value, f'w{index}')
+        expression = _node_value_expression(node, value)
+        if len(expression) <= EXPRESSION_MAX_LENGTH:
+            break
+        start += 1
+
+    paths = {}
+    if start:
+        paths["input"] = f'key_blocks["{ancestors[start-1].name}"].value'
+    for index in range(start, len(ancestors)):
+        paths[f'w{index}'] = f'["{ancestors[index].identifier}"]'
+
+    variables = driver.variables
+    for variable in reversed(list(variables)):
+        if variable.name != "value" and variable.name not in paths:
+            variables.remove(variable)
 
-        target = variable.targets[0]
-        target.id_type = 'KEY'
-        target.id = node.id_data
-        target.data_path = f'key_blocks["{parent.name}"].value'
+    for name, path in paths.items():
+        variable = variables.get(name)
+        if variable is None:
+            variable = variables.new()
+            variable.type = 'SINGLE_PROP'
+            variable.name = name
 
-        driver.expression = f'input*{driver.expression}'
+            target = variable.targets[0]
+            target.id_type = 'KEY'
+            target.id = node.id_data
+
+        variable.targets[0].data_path = path
+
+    expression_set(driver, expression)
+
+
+def _driver_descendants_update(node: 'Node') -> None:
+    key = node.id_data
+    if key.asks.use_flattened_drivers:
+        items = key.asks.nodes.internal__
+        hierarchy = _hierarchy_get(key)
+        index = hierarchy.positions.get(node.name, -1)
+        if index != -1:
+            for child in hierarchy.subtree(index)[1:]:
+                _driver_input_update(items[child], items[hierarchy.parents[child]])
 
 
 class Node(EventDispatcher, PropertyGroup):
@@ -329,7 +820,7 @@ class Node(EventDispatcher, PropertyGroup):
 
     @property
     def index(self) -> int:
-        return self.id_data.asks.nodes.internal__.find(self.name)
+        return _hierarchy_get(self.id_data).positions.get(self.name, -1)
 
     input_range_min: FloatProperty(
         name="Min",
@@ -401,6 +892,7 @@ class Node(EventDispatcher, PropertyGroup):
             index += 1
             value = f'{name}.{str(index).zfill(3)}'
         self["name"] = value
+        _hierarchy_invalidate(self.id_data)
         self.dispatch("name", value, cache)
 
     name: StringProperty(
@@ -412,14 +904,12 @@ class Node(EventDispatcher, PropertyGroup):
 
     @property
     def parent(self) -> Optional['Node']:
-        depth = self.depth - 1
-        if depth >= 0:
-            nodes = self.id_data.asks.nodes.internal__
-            index = self.index - 1
-            while index >= 0:
-                node = nodes[index]
-                if node.depth == depth: return node
-                index -= 1
+        hierarchy = _hierarchy_get(self.id_data)
+        index = hierarchy.positions.get(self.name, -1)
+        if index != -1:
+            index = hierarchy.parents[index]
+            if index != -1:
+                return self.id_data.asks.nodes.internal__[index]
 
     @property
     def subtree(self) -> NodeSubtree:
@@ -436,6 +926,16 @@ class Node(EventDispatcher, PropertyGroup):
     show_expanded: BoolProperty(
         name="Expand",
         default=True,
+        options=set(),
+        update=_show_expanded_update_handler
+        )
+
+    use_analytic_easing: BoolProperty(
+        name="Analytic Easing",
+        description=("Evaluate a power curve fitted to the preset curve in the driver expression instead of "
+                     "interpolating keyframes. Only applies to preset curves"),
+        get=lambda self: self.get("use_analytic_easing", False),
+        set=_use_analytic_easing_set,
         options=set()
         )
 
@@ -443,18 +943,25 @@ class Node(EventDispatcher, PropertyGroup):
     def value_path(self) -> str:
         return f'key_blocks["{self.name}"].value'
 
-    def __init__(self, key: ShapeKey, parent: 'Node', handlers: Dict[str, Callable]) -> None:
+    def __init__(self,
+                 key: ShapeKey,
+                 parent: 'Node',
+                 handlers: Dict[str, Callable],
+                 fcurve: Optional['FCurve']=None) -> None:
         self["identifier"] = f'asks_node_{uuid4().hex}'
-        self["name"] = key.name
-        self["depth"] = parent.depth + 1
+        # Bulk adds write the names and depths of all their nodes and rebuild
+        # the hierarchy once before initializing them.
+        depth = parent.depth + 1
+        if self.get("name") != key.name or self.get("depth") != depth:
+            self["name"] = key.name
+            self["depth"] = depth
+            _hierarchy_invalidate(key.id_data)
         self["input_range_min"] = parent.value_range_min
         self["input_range_max"] = parent.value_range_max
         self["value_range_min"] = key.slider_min
         self["value_range_max"] = key.slider_max
 
-        curve = self.curve
-        curve.__init__()
-        curve.bind("updated", _curve_update_handler)
+        self.curve.__init__()
 
         for event_type, handler in handlers.items():
             self.bind(event_type, handler)
@@ -474,8 +981,9 @@ class Node(EventDispatcher, PropertyGroup):
             if rel:
                 key.relative_key = rel
 
-        _driver_update(self)
-        _fcurve_update(self)
+        fcurve = fcurve or _fcurve_ensure(self)
+        _driver_update(self, parent, fcurve)
+        _fcurve_update(self, fcurve)
 
         self.dispatch("initialized")
         self.__load__()
@@ -495,22 +1003,28 @@ class Node(EventDispatcher, PropertyGroup):
         self.dispatch("loaded")
 
     def __dispose__(self):
-        obj = _objects.get(self.identifier)
+        obj = _objects.pop(self.identifier, None)
         if obj:
             msgbus.clear_by_owner(obj)
-        animdata = self.id_data.animation_data
-        if animdata:
-            drivers = animdata.drivers
-            for path in (f'key_blocks["{self.name}"].value', f'["{self.identifier}"]'):
-                fcurve = drivers.find(path)
-                if fcurve:
-                    drivers.remove(fcurve)
+        id_ = self.id_data
+        for path in (f'key_blocks["{self.name}"].value', f'["{self.identifier}"]'):
+            fcurve = driver_find(id_, path)
+            if fcurve:
+                driver_remove(id_, fcurve)
         try:
             del self.id_data[self.identifier]
         except KeyError:
             pass
+        pose_props_clear(self)
+        self.curve.__dispose__()
+        driver = self.driver
+        if driver:
+            driver.curve.__dispose__()
         self.dispatch("disposed")
 
+
+bind_class(Curve, "updated", _curve_update_handler)
+
 #endregion Node
 
 #region Nodes
@@ -595,6 +1109,7 @@ class ASKS_OT_node_add(PollActiveNode, Operator):
     bl_description = "Add a new shape"
     bl_options = {'INTERNAL', 'UNDO'}
 
+    @event_batch()
     def execute(self, context: 'Context') -> Set[str]:
         ob = context.object
         kb = ob.shape_key_add(from_mix=False)
@@ -664,6 +1179,15 @@ def _draw_interpolation_settings(layout: 'UILayout',
 
     draw_curve(layout, node.curve, heading="Curve")
 
+    curve = node.curve
+    if curve.type not in {'LINEAR', 'CUSTOM'}:
+        row = split_layout(layout, heading="Easing")[1].row()
+        row.prop(node, "use_analytic_easing", text="Analytic")
+        if node.use_analytic_easing:
+            deviation = easing_deviation(curve.type, curve.easing)
+            row.label(icon='CHECKMARK' if deviation <= EASING_TOLERANCE else 'ERROR',
+                      text=f'Deviation {deviation:.3f}')
+
 
 class ASKS_PT_interpolation(PollActiveChildNode, Panel):
     bl_idname = "ASKS_PT_interpolation"
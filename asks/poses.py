@@ -0,0 +1,355 @@
+from typing import List, Optional, Sequence, Tuple, TYPE_CHECKING
+from uuid import uuid4
+import numpy as np
+from mathutils import Quaternion
+from .fcurves import driver_ensure, driver_find, driver_remove
+from .expressions import EXPRESSION_MAX_LENGTH, expression_number, expression_set
+from .events import log
+if TYPE_CHECKING:
+    from bpy.types import Driver, Key
+    from .drivers import WeightDriver
+    from .groups import NodeGroup
+    from .nodes import Node
+
+# Settings shared by all pose drivers in a group. The poses themselves (location,
+# rotation, scale and radius) are specific to each driver.
+POSE_GROUP_SETTINGS = (
+    "data_target",
+    "bone_target",
+    "use_location",
+    "use_rotation",
+    "use_scale",
+    "rotation_mode",
+    "rotation_order",
+    "swing_twist_axis",
+    )
+
+# Regularization added to the kernel matrix. It keeps the weights small enough
+# for single precision driver variables when poses are close together.
+POSE_SMOOTHING = 1e-3
+
+POSE_RADIUS_MIN = 0.001
+
+
+def _group_identifier_ensure(group: 'NodeGroup') -> str:
+    identifier = group.identifier
+    if not identifier:
+        identifier = f'asks_group_{uuid4().hex}'
+        group["identifier"] = identifier
+    return identifier
+
+
+def pose_nodes(group: 'NodeGroup') -> List['Node']:
+    return [node for node in group.nodes() if node.driver and node.driver.type == 'POSE']
+
+
+def pose_channels(settings: 'WeightDriver') -> List[Tuple[str, str]]:
+    channels = []
+
+    for axis, used in zip("XYZ", settings.use_location):
+        if used:
+            channels.append((f'LOC_{axis}', 'AUTO'))
+
+    mode = settings.rotation_mode
+    if mode == 'QUATERNION':
+        channels.extend((f'ROT_{axis}', 'QUATERNION') for axis in "WXYZ")
+    elif mode == 'EULER':
+        order = settings.rotation_order
+        for axis, used in zip("XYZ", settings.use_rotation):
+            if used:
+                channels.append((f'ROT_{axis}', order))
+    else:
+        # In swing/twist modes the twist axis channel holds the twist angle and
+        # the remaining channels the swing quaternion.
+        twist = settings.swing_twist_axis
+        rotation_mode = f'SWING_TWIST_{twist}'
+        if mode == 'TWIST':
+            channels.append((f'ROT_{twist}', rotation_mode))
+        else:
+            channels.extend((f'ROT_{axis}', rotation_mode) for axis in "WXYZ" if axis != twist)
+
+    for axis, used in zip("XYZ", settings.use_scale):
+        if used:
+            channels.append((f'SCALE_{axis}', 'AUTO'))
+
+    return channels
+
+
+def pose_center(settings: 'WeightDriver', channels: Sequence[Tuple[str, str]]) -> List[float]:
+    location = settings.location
+    rotation = Quaternion(settings.rotation_quaternion)
+    scale = settings.scale
+    result = []
+
+    for transform_type, rotation_mode in channels:
+        kind, _, axis = transform_type.partition("_")
+        if kind == 'LOC':
+            result.append(location["XYZ".index(axis)])
+        elif kind == 'SCALE':
+            result.append(scale["XYZ".index(axis)])
+        elif rotation_mode == 'QUATERNION':
+            result.append(rotation["WXYZ".index(axis)])
+        elif rotation_mode.startswith('SWING_TWIST'):
+            twist_axis = rotation_mode[-1]
+            swing, twist = rotation.to_swing_twist(twist_axis)
+            result.append(twist if axis == twist_axis else swing["WXYZ".index(axis)])
+        else:
+            # The target's own rotation order can not be known here
+            order = 'XYZ' if rotation_mode == 'AUTO' else rotation_mode
+            result.append(rotation.to_euler(order)["XYZ".index(axis)])
+
+    return result
+
+
+def pose_weights_solve(centers: np.ndarray, radii: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    count = len(radii)
+
+    # phi[i, j] is the activation of pose j's kernel at pose i
+    delta = centers[:, np.newaxis, :] - centers[np.newaxis, :, :]
+    phi = np.exp(-np.einsum('ijk,ijk->ij', delta, delta) / np.square(radii)[np.newaxis, :])
+
+    identity = np.eye(count)
+    try:
+        weights = np.linalg.solve(phi + identity * POSE_SMOOTHING, identity)
+    except np.linalg.LinAlgError:
+        weights = np.linalg.lstsq(phi, identity, rcond=None)[0]
+
+    # Scale each pose's output so that it peaks at 1.0 at its own center
+    peaks = np.einsum('ij,ji->i', phi, weights)
+    norms = 1.0 / np.where(np.abs(peaks) > 1e-6, peaks, 1.0)
+    return weights, norms
+
+
+def _pose_radii(nodes: Sequence['Node'], centers: np.ndarray) -> np.ndarray:
+    radii = np.array([node.driver.radius for node in nodes], dtype=float)
+    count = len(nodes)
+    if count > 1:
+        delta = centers[:, np.newaxis, :] - centers[np.newaxis, :, :]
+        distances = np.sqrt(np.einsum('ijk,ijk->ij', delta, delta))
+        np.fill_diagonal(distances, np.inf)
+        nearest = distances.min(axis=1)
+        auto = np.array([node.driver.auto_adjust_radius for node in nodes], dtype=bool)
+        radii = np.where(auto & np.isfinite(nearest), nearest, radii)
+    return np.maximum(radii, POSE_RADIUS_MIN)
+
+
+def _variable_ensure(driver: 'Driver', name: str, type_: str='SINGLE_PROP'):
+    variables = driver.variables
+    variable = variables.get(name)
+    if variable is None or variable.type != type_:
+        if variable is not None:
+            variables.remove(variable)
+        variable = variables.new()
+        variable.name = name
+        variable.type = type_
+    return variable
+
+
+def _variables_trim(driver: 'Driver', names: Sequence[str]) -> None:
+    variables = driver.variables
+    names = set(names)
+    for variable in reversed(list(variables)):
+        if variable.name not in names:
+            variables.remove(variable)
+
+
+def _array_drivers_trim(key: 'Key', name: str, count: int) -> None:
+    # The drivers of an array are created along with its items, so only the
+    # indices from count up to its current length can have one.
+    value = key.get(name)
+    if value is None:
+        return
+    path = f'["{name}"]'
+    for index in range(count, len(value)):
+        fcurve = driver_find(key, path, index)
+        if fcurve is not None:
+            driver_remove(key, fcurve)
+
+
+def _key_variable_ensure(driver: 'Driver', name: str, key: 'Key', path: str) -> None:
+    # Targets are only written when they differ, as each write rebuilds the
+    # depsgraph relations.
+    target = _variable_ensure(driver, name).targets[0]
+    if target.id_type != 'KEY':
+        target.id_type = 'KEY'
+    if target.id != key:
+        target.id = key
+    if target.data_path != path:
+        target.data_path = path
+
+
+def _weighted_sum_chunks(count: int) -> List[range]:
+    # Packs the terms of a node's weighted sum of kernels into expressions
+    # that fit within the length limit.
+    chunks = []
+    start = 0
+    length = len("()*n")
+    for index in range(count):
+        size = 2 * len(str(index)) + 5
+        if index > start and length + size > EXPRESSION_MAX_LENGTH:
+            chunks.append(range(start, index))
+            start = index
+            length = len("()*n")
+        length += size
+    if count:
+        chunks.append(range(start, count))
+    return chunks
+
+
+def _weighted_sum_update(driver: 'Driver', key: 'Key', group_identifier: str, identifier: str, indices: range) -> None:
+    names = []
+    for index in indices:
+        for name, path in ((f'k{index}', f'["{group_identifier}"][{index}]'),
+                           (f'p{index}', f'["{identifier}_pose"][{index}]')):
+            _key_variable_ensure(driver, name, key, path)
+            names.append(name)
+    _key_variable_ensure(driver, "n", key, f'["{identifier}_norm"][0]')
+    names.append("n")
+    _variables_trim(driver, names)
+    expression_set(driver, f'({"+".join(f"p{index}*k{index}" for index in indices)})*n')
+
+
+def _kernel_expression_format(center: Sequence[float], radius: float) -> str:
+    terms = []
+    for index, value in enumerate(center):
+        if value < 0.0:
+            terms.append(f'pow(x{index}+{expression_number(-value)},2.0)')
+        else:
+            terms.append(f'pow(x{index}-{expression_number(value)},2.0)')
+    return f'exp(-({"+".join(terms)})*{expression_number(1.0 / (radius * radius))})'
+
+
+def _kernel_drivers_update(key: 'Key',
+                           identifier: str,
+                           settings: Optional['WeightDriver'],
+                           channels: Sequence[Tuple[str, str]],
+                           centers: np.ndarray,
+                           radii: np.ndarray) -> None:
+    import bpy
+    count = len(radii)
+    path = f'["{identifier}"]'
+
+    _array_drivers_trim(key, identifier, count)
+
+    if count == 0:
+        if identifier in key:
+            del key[identifier]
+        return
+
+    value = key.get(identifier)
+    if value is None or len(value) != count:
+        key[identifier] = [0.0] * count
+
+    target = bpy.data.objects.get(settings.data_target) if settings else None
+    bone = settings.bone_target if settings else ""
+
+    for index in range(count):
+        driver = driver_ensure(key, path, index).driver
+        names = [f'x{channel}' for channel in range(len(channels))]
+        _variables_trim(driver, names)
+
+        for name, (transform_type, rotation_mode) in zip(names, channels):
+            variable = _variable_ensure(driver, name, 'TRANSFORMS')
+            variable_target = variable.targets[0]
+            variable_target.id = target
+            variable_target.bone_target = bone
+            variable_target.transform_type = transform_type
+            variable_target.transform_space = 'LOCAL_SPACE'
+            variable_target.rotation_mode = rotation_mode
+
+        expression = "0.0"
+        if target is not None and channels:
+            expression = _kernel_expression_format(centers[index], radii[index])
+            if len(expression) > EXPRESSION_MAX_LENGTH:
+                log.error(f'{key.name}: too many channels for a pose driver expression ({len(channels)})')
+                expression = "0.0"
+        expression_set(driver, expression)
+
+
+def _weight_driver_update(node: 'Node', group_identifier: str, count: int) -> None:
+    # The pose weight is the sum of the group's kernels scaled by the node's
+    # weights and norm, which are read from its _pose and _norm arrays so that
+    # editing poses leaves the drivers alone. Sums too long for a single
+    # expression are split across the drivers of a partial sums array and
+    # added by a SUM driver.
+    key = node.id_data
+    identifier = node.identifier
+    partial = f'{identifier}_partial'
+    chunks = _weighted_sum_chunks(count)
+    driver = driver_ensure(key, node.driver.data_path).driver
+
+    if len(chunks) < 2:
+        _array_drivers_trim(key, partial, 0)
+        if partial in key:
+            del key[partial]
+        _weighted_sum_update(driver, key, group_identifier, identifier, range(count))
+        return
+
+    path = f'["{partial}"]'
+    _array_drivers_trim(key, partial, len(chunks))
+    value = key.get(partial)
+    if value is None or len(value) != len(chunks):
+        key[partial] = [0.0] * len(chunks)
+
+    for index, chunk in enumerate(chunks):
+        _weighted_sum_update(driver_ensure(key, path, index).driver, key, group_identifier, identifier, chunk)
+
+    names = []
+    for index in range(len(chunks)):
+        name = f's{index}'
+        _key_variable_ensure(driver, name, key, f'{path}[{index}]')
+        names.append(name)
+    _variables_trim(driver, names)
+    if driver.type != 'SUM':
+        driver.type = 'SUM'
+
+
+def pose_props_clear(node: 'Node') -> None:
+    key = node.id_data
+    partial = f'{node.identifier}_partial'
+    _array_drivers_trim(key, partial, 0)
+    for name in (partial, f'{node.identifier}_pose', f'{node.identifier}_norm'):
+        if name in key:
+            del key[name]
+
+
+def pose_group_clear(group: 'NodeGroup') -> None:
+    key = group.id_data
+    identifier = group.identifier
+    if identifier:
+        _kernel_drivers_update(key, identifier, None, (), np.zeros((0, 0)), np.zeros(0))
+
+
+def pose_group_update(group: 'NodeGroup') -> None:
+    key = group.id_data
+    identifier = _group_identifier_ensure(group)
+    nodes = pose_nodes(group)
+    count = len(nodes)
+
+    settings = nodes[0].driver if count else None
+    channels = pose_channels(settings) if settings else []
+    centers = np.array([pose_center(node.driver, channels) for node in nodes], dtype=float)
+    centers = centers.reshape(count, len(channels))
+    radii = _pose_radii(nodes, centers)
+
+    _kernel_drivers_update(key, identifier, settings, channels, centers, radii)
+    if count == 0:
+        return
+
+    weights, norms = pose_weights_solve(centers, radii)
+    for index, node in enumerate(nodes):
+        key[f'{node.identifier}_pose'] = weights[:, index].tolist()
+        key[f'{node.identifier}_norm'] = [float(norms[index])]
+        _weight_driver_update(node, identifier, count)
+
+
+def pose_settings_sync(settings: 'WeightDriver', group: 'NodeGroup') -> None:
+    for node in pose_nodes(group):
+        other = node.driver
+        if other != settings:
+            for name in POSE_GROUP_SETTINGS:
+                value = settings.get(name)
+                if value is not None:
+                    other[name] = value
+                elif name in other:
+                    del other[name]
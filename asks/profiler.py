@@ -0,0 +1,194 @@
+from typing import Any, Dict, Iterator, List, Optional, Set, TYPE_CHECKING
+from time import perf_counter
+from bpy.types import Operator, Panel
+from bpy.props import IntProperty, StringProperty
+from .utils import PollActiveNode, PollSystemEnabled
+from .fcurves import driver_find
+from .expressions import python_drivers
+from .events import event_counters, log
+if TYPE_CHECKING:
+    from bpy.types import Context, FCurve, Key, Scene
+    from .nodes import Node
+
+# Reports are keyed by the key's pointer and only live for the session.
+_reports: Dict[int, Dict[str, Any]] = {}
+
+
+def report_get(key: 'Key') -> Optional[Dict[str, Any]]:
+    return _reports.get(key.as_pointer())
+
+
+def reports_clear() -> None:
+    _reports.clear()
+
+
+def _node_fcurves(node: 'Node') -> Iterator['FCurve']:
+    key = node.id_data
+    fcurve = driver_find(key, f'key_blocks["{node.name}"].value')
+    if fcurve:
+        yield fcurve
+    driver = node.driver
+    if driver:
+        fcurve = driver_find(key, driver.data_path)
+        if fcurve:
+            yield fcurve
+
+
+def _playback_time(scene: 'Scene', frames: range, repeat: int) -> float:
+    # The fastest run is the least disturbed by everything else going on.
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        for frame in frames:
+            scene.frame_set(frame)
+        elapsed = perf_counter() - start
+        if result is None or elapsed < result:
+            result = elapsed
+    return result
+
+
+def profile(key: 'Key', scene: 'Scene', frames: range, repeat: int=3) -> Dict[str, Any]:
+    frame = scene.frame_current
+    nodes = []
+    try:
+        baseline = _playback_time(scene, frames, repeat)
+        for node in key.asks.nodes:
+            if node.depth == 0:
+                continue
+
+            fcurves = [fcurve for fcurve in _node_fcurves(node) if not fcurve.mute]
+            python = sum(1 for fcurve in fcurves
+                         if fcurve.driver.type == 'SCRIPTED' and not fcurve.driver.is_simple_expression)
+            for fcurve in fcurves:
+                fcurve.mute = True
+            try:
+                elapsed = _playback_time(scene, frames, repeat)
+            finally:
+                for fcurve in fcurves:
+                    fcurve.mute = False
+
+            driver = node.driver
+            nodes.append({
+                "name": node.name,
+                "depth": node.depth,
+                "driver_type": driver.type if driver else "",
+                "drivers": len(fcurves),
+                "python_drivers": python,
+                "time": elapsed,
+                "cost": baseline - elapsed,
+                })
+    finally:
+        scene.frame_set(frame)
+
+    nodes.sort(key=lambda item: item["cost"], reverse=True)
+    count = len(frames)
+    report = {
+        "key": key.name,
+        "frame_start": frames.start,
+        "frame_end": frames.stop - 1,
+        "repeat": repeat,
+        "baseline": baseline,
+        "fps": count / baseline if baseline > 0.0 else 0.0,
+        "python_drivers": len(python_drivers(key)),
+        "nodes": nodes,
+        }
+    _reports[key.as_pointer()] = report
+    return report
+
+
+class ASKS_OT_system_profile(PollSystemEnabled, Operator):
+    bl_idname = "asks.system_profile"
+    bl_label = "Profile Drivers"
+    bl_description = ("Play the frame range with each shape key's drivers muted in turn and rank the shape "
+                      "keys by the evaluation time their drivers cost")
+    bl_options = {'REGISTER'}
+
+    frame_start: IntProperty(
+        name="Start",
+        default=-1,
+        options=set()
+        )
+
+    frame_end: IntProperty(
+        name="End",
+        default=-1,
+        options=set()
+        )
+
+    repeat: IntProperty(
+        name="Repeat",
+        description="Number of times each measurement is taken. The fastest is used",
+        default=3,
+        min=1,
+        options=set()
+        )
+
+    filepath: StringProperty(
+        name="File Path",
+        description="JSON file the report is written to",
+        default="//asks_profile.json",
+        subtype='FILE_PATH',
+        options=set()
+        )
+
+    def execute(self, context: 'Context') -> Set[str]:
+        import json
+        import bpy
+        key = context.object.data.shape_keys
+        scene = context.scene
+        start = scene.frame_start if self.frame_start < 0 else self.frame_start
+        end = scene.frame_end if self.frame_end < 0 else self.frame_end
+        if end < start:
+            self.report({'ERROR'}, "Invalid frame range")
+            return {'CANCELLED'}
+
+        report = profile(key, scene, range(start, end + 1), self.repeat)
+
+        if self.filepath:
+            path = bpy.path.abspath(self.filepath)
+            try:
+                with open(path, "w") as file:
+                    json.dump(report, file, indent=2)
+            except OSError as error:
+                log.error(f'Failed to write driver profile to {path}: {error}')
+                self.report({'WARNING'}, f'Failed to write {path}')
+
+        self.report({'INFO'}, (f'{report["fps"]:.1f} fps, '
+                               f'{report["python_drivers"]} drivers use the Python evaluator'))
+        return {'FINISHED'}
+
+
+class ASKS_PT_profile(PollActiveNode, Panel):
+    bl_idname = "ASKS_PT_profile"
+    bl_label = "Profiler"
+    bl_space_type = 'PROPERTIES'
+    bl_region_type = 'WINDOW'
+    bl_context = "data"
+    bl_parent_id = "ASKS_PT_shape_keys"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context: 'Context') -> None:
+        layout = self.layout
+        layout.operator("asks.system_profile", icon='TIME')
+
+        counters = event_counters()
+        col = layout.column(align=True)
+        col.label(text=f'Events dispatched: {sum(v for k, v in counters.items() if k.startswith("dispatch:"))}')
+        col.label(text=(f'Handler cache: {counters.get("handler_hits", 0)} hits, '
+                        f'{counters.get("handler_misses", 0)} misses'))
+
+        report = report_get(context.object.data.shape_keys)
+        if report is None:
+            return
+
+        col = layout.column(align=True)
+        col.label(text=f'Frames {report["frame_start"]}-{report["frame_end"]}: {report["fps"]:.1f} fps')
+        col.label(text=f'Python drivers: {report["python_drivers"]}')
+
+        col = layout.column(align=True)
+        nodes: List[Dict[str, Any]] = report["nodes"]
+        for item in nodes[:10]:
+            row = col.row()
+            row.label(text=item["name"], icon='ERROR' if item["python_drivers"] else 'SHAPEKEY_DATA')
+            row.label(text=item["driver_type"] or "-")
+            row.label(text=f'{item["cost"] * 1000.0:.2f} ms')
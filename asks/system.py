@@ -1,15 +1,31 @@
 
-from typing import Set, Type, TYPE_CHECKING
+from typing import Callable, ContextManager, Dict, Optional, Set, Type, TYPE_CHECKING
+from dataclasses import dataclass
 from uuid import uuid4
 from asks.utils import PollActiveNode
 from bpy.types import DATA_PT_shape_keys, NodeTree, Operator, Panel, PropertyGroup, UILayout, UIList
 from bpy.props import BoolProperty, PointerProperty, StringProperty
 from .config import COMPAT_ENGINES, COMPAT_OBJECTS
-from .nodes import Nodes
+from .events import event_batch
+from .fcurves import driver_find
+from .nodes import Nodes, _driver_input_update, _hierarchy_get, _hierarchy_invalidate
 from .groups import NodeGroups
 if TYPE_CHECKING:
-    from bpy.types import Context
-    from .nodes import Node
+    from bpy.types import Context, FCurve, Key, ShapeKey
+    from .drivers import WeightDriver
+    from .nodes import Node, NodeHierarchy
+
+
+def _use_flattened_drivers_set(system: 'System', value: bool) -> None:
+    value = bool(value)
+    if value != system.use_flattened_drivers:
+        system["use_flattened_drivers"] = value
+        if system.enabled:
+            key = system.id_data
+            items = system.nodes.internal__
+            hierarchy = _hierarchy_get(key)
+            for index in range(1, len(hierarchy)):
+                _driver_input_update(items[index], items[hierarchy.parents[index]])
 
 
 class System(PropertyGroup):
@@ -40,7 +56,16 @@ class System(PropertyGroup):
         options=set()
         )
 
-    def __init__(self) -> None:
+    use_flattened_drivers: BoolProperty(
+        name="Flatten Drivers",
+        description=("Inline each shape key's ancestors into its driver instead of reading its parent's "
+                     "value, so that the drivers of a deep hierarchy can be evaluated in parallel"),
+        get=lambda self: self.get("use_flattened_drivers", False),
+        set=_use_flattened_drivers_set,
+        options=set()
+        )
+
+    def __init__(self, progress: Optional[Callable[[int, int], None]]=None) -> None:
         import bpy
         self["identifier"] = f'asks_{uuid4().hex}'
         self.nodetree__ = bpy.data.node_groups.new(self.identifier, "ShaderNodeTree")
@@ -52,16 +77,19 @@ class System(PropertyGroup):
         basis["depth"] = 0
         basis.curve.__init__()
         key[basis.identifier] = 1.0
+        _hierarchy_invalidate(key)
 
-        children = basis.children
-        for kb in key.key_blocks[1:]:
-            children.add(kb)
+        basis.children.add_many(key.key_blocks[1:], progress)
 
         self["enabled"] = True
 
     def __dispose__(self) -> None:
         self["enabled"] = False
 
+    def batch(self) -> ContextManager[None]:
+        # Coalesces the events dispatched within the context (see event_batch)
+        return event_batch()
+
 
 class ASKS_OT_system_enable(Operator):
     bl_idname = "asks.system_enable"
@@ -78,8 +106,15 @@ class ASKS_OT_system_enable(Operator):
                 key = obj.data.shape_keys
                 return key is None or not key.is_property_set("asks") or not key.asks.enabled
 
+    @event_batch()
     def execute(self, context: 'Context') -> Set[str]:
-        context.object.data.shape_keys.asks.__init__()
+        key = context.object.data.shape_keys
+        wm = context.window_manager
+        wm.progress_begin(0, len(key.key_blocks))
+        try:
+            key.asks.__init__(lambda index, _: wm.progress_update(index))
+        finally:
+            wm.progress_end()
         return {'FINISHED'}
 
 
@@ -123,34 +158,76 @@ class ASKS_PT_shape_keys_subpanel(Panel):
         self.layout.operator("asks.system_enable")
 
 
-class ASKS_UL_shape_keys(UIList):
+@dataclass
+class NodeRow:
+    shape_key: Optional['ShapeKey']
+    fcurve: Optional['FCurve']
+    driver: Optional['WeightDriver']
+    driver_type: str
+    driver_mute: bool
+    is_interpolated: bool
+    has_children: bool
 
-    sep_icon = 0
 
-    def filter_items(self, _, nodes: Nodes, prop):
+class NodeRows:
+
+    def __init__(self, key: 'Key') -> None:
+        self.key = key
+        self.hierarchy: 'NodeHierarchy' = _hierarchy_get(key)
+        self.rows: Dict[int, NodeRow] = {}
 
-        nodes = getattr(nodes, prop)
-        flags = [self.bitflag_filter_item] * len(nodes)
-        count = len(nodes)
-        order = list(range(count))
-        depth = -1
+    def get(self, node: 'Node', index: int) -> NodeRow:
+        row = self.rows.get(index)
+        if row is None:
+            key = self.key
+            driver = node.driver
+            fcurve = driver_find(key, f'key_blocks["{node.name}"].value')
+            driver_fcurve = driver_find(key, driver.data_path) if driver else None
+            row = NodeRow(shape_key=key.key_blocks.get(node.name),
+                          fcurve=fcurve,
+                          driver=driver,
+                          driver_type=driver.type if driver else "",
+                          driver_mute=driver_fcurve is None or driver_fcurve.mute,
+                          is_interpolated=fcurve is not None and not fcurve.mute,
+                          has_children=self.hierarchy.ends[index] > index + 1)
+            self.rows[index] = row
+        return row
+
+
+# Row data is rebuilt by filter_items, which runs once at the start of every
+# redraw of the list, and shared by the draw_item calls that follow it.
+_rows: Dict[int, NodeRows] = {}
+
+
+def _rows_get(key: 'Key') -> NodeRows:
+    rows = _rows.get(key.as_pointer())
+    if rows is None or rows.hierarchy is not _hierarchy_get(key):
+        rows = NodeRows(key)
+        _rows[key.as_pointer()] = rows
+    return rows
 
-        for index, node in enumerate(nodes):
 
-            if depth > -1 and node.depth > depth:
-                flags[index] &= ~self.bitflag_filter_item
-                continue
+def rows_invalidate(key: Optional['Key']=None) -> None:
+    if key is None:
+        _rows.clear()
+    else:
+        _rows.pop(key.as_pointer(), None)
 
-            if (not node.show_expanded
-                and index < count - 1
-                and nodes[index+1].depth == node.depth + 1
-                ):
-                depth = node.depth
-                continue
 
-            depth = -1
+class ASKS_UL_shape_keys(UIList):
 
-        return flags, order
+    sep_icon = 0
+
+    def filter_items(self, _, nodes: Nodes, prop):
+        key = nodes.id_data
+        _rows[key.as_pointer()] = NodeRows(key)
+        flag = self.bitflag_filter_item
+        flags = _hierarchy_get(key).filter(flag, self.filter_name)
+        # The list inverts the flags it is given when its filter is inverted,
+        # which should only apply to name filtering, not to collapsed nodes.
+        if self.use_filter_invert and not self.filter_name:
+            flags = [value ^ flag for value in flags]
+        return flags, []
 
     def draw_item(self, _0, layout: 'UILayout', nodes: 'Nodes', node: 'Node', _2, _3, _4, index: int) -> None:
         sep = self.sep_icon
@@ -170,17 +247,19 @@ class ASKS_UL_shape_keys(UIList):
         opts_data_val = opts_data_spl.row(align=True)
         opts_data_val.label(icon_value=sep)
 
-        depth = node.depth
-        shape = node.shape_key
+        rows = _rows_get(node.id_data)
+        row = rows.get(node, index)
+        depth = rows.hierarchy.depths[index]
+        shape = row.shape_key
 
         if depth:
-            for _ in range(node.depth - 1):
+            for _ in range(depth - 1):
                 tree.label(icon_value=sep)
 
-            if index < len(nodes) - 1 and nodes[index + 1].depth > depth:
+            if row.has_children:
                 tree.prop(node, "show_expanded",
                          text="",
-                         icon=f'DISCLOSURE_TRI_{"DOWN" if node.show_expanded else "RIGHT"}',
+                         icon=f'DISCLOSURE_TRI_{"DOWN" if rows.hierarchy.expanded[index] else "RIGHT"}',
                          emboss=False)
             else:
                 tree.label(icon_value=sep)
@@ -201,12 +280,12 @@ class ASKS_UL_shape_keys(UIList):
 
         # weight value
         if depth:
-            driver = node.driver
+            driver = row.driver
             if driver:
                 opts_data_wgt.context_pointer_set("node", node)
                 opts_data_wgt.prop(driver, "mute",
                                    text="",
-                                   icon_value=UILayout.enum_item_icon(driver, "type", driver.type))
+                                   icon_value=UILayout.enum_item_icon(driver, "type", row.driver_type))
                 opts_data_wgt.popover('ASKS_PT_weight_popover',
                                       text="",
                                       icon='DOWNARROW_HLT')
@@ -218,7 +297,7 @@ class ASKS_UL_shape_keys(UIList):
                                                  ).node_target = node.name
             # TODO prop not extant
             subrow = opts_data_wgt.row(align=True)
-            subrow.enabled = driver is None or driver.mute
+            subrow.enabled = driver is None or row.driver_mute
             subrow.prop(node.id_data, f'["{node.identifier}"]', text="")
         else:
             subrow = opts_data_wgt.row(align=True)
@@ -229,15 +308,15 @@ class ASKS_UL_shape_keys(UIList):
         if depth:
             opts_data_val.prop(node, "is_interpolated",
                                text="",
-                               icon=f'RADIOBUT_{"ON" if node.is_interpolated else "OFF"}')
+                               icon=f'RADIOBUT_{"ON" if row.is_interpolated else "OFF"}')
 
             subrow = opts_data_val.row(align=True)
-            subrow.enabled = node.is_interpolated
+            subrow.enabled = row.is_interpolated
             subrow.context_pointer_set("node", node)
             subrow.popover('ASKS_PT_interpolation_popover', text="", icon='DOWNARROW_HLT')
 
             subrow = opts_data_val.row(align=True)
-            subrow.enabled = not node.is_interpolated
+            subrow.enabled = not row.is_interpolated
             subrow.prop(shape, "value", text="")
         else:
             subrow = opts_data_val.row(align=True)
@@ -264,9 +343,12 @@ class ASKS_PT_shape_keys(PollActiveNode, Panel):
 
     def draw(self, context: 'Context') -> None:
         layout = self.layout
-        nodes = context.object.data.shape_keys.asks.nodes
+        system = context.object.data.shape_keys.asks
+        nodes = system.nodes
         row = layout.row()
         col = row.column()
         col.template_list("ASKS_UL_shape_keys", "", nodes, "internal__", nodes, "active_index", rows=10)
+        col.prop(system, "use_flattened_drivers")
+        col.operator("asks.curve_nodes_cleanup", icon='TRASH')
         col = row.column(align=True)
         col.operator("ASKS_OT_node_add", text="", icon='ADD')
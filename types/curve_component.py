@@ -1,13 +1,14 @@
 
 from typing import Any, Dict, Iterator, List, Optional, Protocol, Sequence, Tuple, TYPE_CHECKING, Union
 from dataclasses import dataclass
+import numpy as np
 from bpy.types import PropertyGroup
-from mathutils import Vector
 from bpy.props import (BoolProperty,
                        CollectionProperty,
                        EnumProperty,
                        FloatVectorProperty,
                        PointerProperty)
+from ..asks.curves import bezier_handles, points_changed
 from .component import Component
 if TYPE_CHECKING:
     from bpy.types import UILayout
@@ -166,81 +167,6 @@ def point_location_x(point: 'CurveComponentPoint') -> float:
     return point.location[0]
 
 
-def calc_bezier_handles(p2, ht, h1, h2, prev=None, next=None) -> None:
-    pt = Vector((0.0, 0.0))
-
-    if prev is None:
-        p3 = next
-        pt[0] = 2.0 * p2[0] - p3[0]
-        pt[1] = 2.0 * p2[1] - p3[1]
-        p1 = pt
-    else:
-        p1 = prev
-
-    if next is None:
-        p1 = prev
-        pt[0] = 2.0 * p2[0] - p1[0]
-        pt[1] = 2.0 * p2[1] - p1[1]
-        p3 = pt
-    else:
-        p3 = next
-
-    dvec_a = p2 - p1
-    dvec_b = p3 - p2
-    len_a = dvec_a.length
-    len_b = dvec_b.length
-
-    if len_a == 0.0:
-        len_a = 1.0
-    if len_b == 0.0:
-        len_b = 1.0
-
-    if ht in ('AUTO', 'AUTO_CLAMPED'):
-        tvec = Vector((
-            dvec_b[0] / len_b + dvec_a[0] / len_a,
-            dvec_b[1] / len_b + dvec_a[1] / len_a))
-
-        length = tvec.length * 2.5614
-        if length != 0.0:
-            ln = -(len_a / length)
-            h1[0] = p2[0] + tvec[0] * ln
-            h1[1] = p2[1] + tvec[1] * ln
-            if ht == 'AUTO_CLAMPED' and prev is not None and next is not None:
-                ydiff1 = prev[1] - p2[1]
-                ydiff2 = next[1] - p2[1]
-                if (ydiff1 <= 0.0 and ydiff2 <= 0.0) or (ydiff1 >= 0.0 and ydiff2 >= 0.0):
-                    h1[1] = p2[1]
-                else:
-                    if ydiff1 <= 0.0:
-                        if prev[1] > h1[1]:
-                            h1[1] = prev[1]
-                    else:
-                        if prev[1] < h1[1]:
-                            h1[1] = prev[1]
-
-            ln = len_b / length
-            h2[0] = p2[0] + tvec[0] * ln
-            h2[1] = p2[1] + tvec[1] * ln
-            if ht == 'AUTO_CLAMPED' and prev is not None and next is not None:
-                ydiff1 = prev[1] - p2[1]
-                ydiff2 = next[1] - p2[1]
-                if (ydiff1 <= 0.0 and ydiff2 <= 0.0) or (ydiff1 >= 0.0 and ydiff2 >= 0.0):
-                    h2[1] = p2[1]
-                else:
-                    if ydiff1 <= 0.0:
-                        if next[1] < h2[1]:
-                            h2[1] = next[1]
-                    else:
-                        if next[1] > h2[1]:
-                            h2[1] = next[1]
-
-    else: # ht == VECTOR
-        h1[0] = p2[0] + dvec_a[0] * (-1.0/3.0)
-        h1[1] = p2[1] + dvec_a[1] * (-1.0/3.0)
-        h2[0] = p2[0] + dvec_b[0] * (1.0/3.0)
-        h2[1] = p2[1] + dvec_b[1] * (1.0/3.0)
-
-
 class CurveComponentPoint(PropertyGroup):
 
     @property
@@ -276,7 +202,7 @@ class CurveComponentPoint(PropertyGroup):
         )
 
     def __init__(self, point: CurvePointProtocol) -> None:
-        self["handle_type"] = HANDLE_TYPE_ENUM_INDEX.index(point.handle_type)
+        self["handle_type"] = HANDLE_TYPE_ENUM_INDEX[point.handle_type]
         self["location"] = tuple(point.location)
         self["select"] = point.select
 
@@ -292,20 +218,20 @@ class CurveComponentPoints(PropertyGroup):
         return any(x == point for x in self)
 
     def __init__(self, points: Sequence[CurvePointProtocol]) -> None:
-        items = self.points.collection__internal__
+        items = self.collection__internal__
         length = len(items)
         number = len(points)
 
         while length > number:
-            items.remove(0)
             length -= 1
+            items.remove(length)
 
         while length < number:
             items.add()
             length += 1
 
-        for item, point in zip(items, points):
-            item.__init__(point)
+        for index in points_changed(items, points):
+            items[index].__init__(points[index])
 
     def __iter__(self) -> Iterator[CurveComponentPoint]:
         return iter(self.collection__internal__)
@@ -353,87 +279,35 @@ class CurveComponentPoints(PropertyGroup):
             component = self.id_data.path_resolve(path.rpartition(".")[0])
             extrapolate = component.extend == 'EXTRAPOLATED'
 
-        data = [(
-            p.location.copy(),
-            p.handle_type,
-            Vector((0.0, 0.0)),
-            Vector((0.0, 0.0))
-            ) for p in points]
+        count = len(points)
+        co = np.empty(count * 2, dtype=float)
+        handle_types = np.empty(count, dtype=int)
+        points.foreach_get("location", co)
+        points.foreach_get("handle_type", handle_types)
+        co = co.reshape(1, count, 2)
+        handle_types = handle_types.reshape(1, count)
 
         if range_x:
             a, b = range_x
             if a > b:
                 a, b = b, a
-                for item in data:
-                    item[0][0] = 1.0 - item[0][0]
-                data.reverse()
-            d = b - a
-            for item in data:
-                item[0][0] = a + item[0][0] * d
+                co[..., 0] = 1.0 - co[..., 0]
+                co = co[:, ::-1].copy()
+                handle_types = handle_types[:, ::-1].copy()
+            co[..., 0] = a + co[..., 0] * (b - a)
 
         if range_y:
             a, b = range_y
-            d = b - a
-            for item in data:
-                item[0][1] = a + item[0][1] * d
-
-        n = len(data) - 1
-        for i, (pt, ht, h1, h2) in enumerate(data):
-            calc_bezier_handles(pt, ht, h1, h2,
-                                data[i-1][0] if i > 0 else None,
-                                data[i+1][0] if i < n else None)
-
-        if len(data) > 2:
-            ptA, htA, h1A, h2A = data[0]
-            ptN, htN, h1N, h2N = data[-1]
-
-            if htA == 'AUTO':
-                hlen = (h2A - ptA).length
-                hvec = data[1][2].copy()
-                if hvec[0] < ptA[0]:
-                    hvec[0] = ptA[0]
-
-                hvec -= ptA
-                nlen = hvec.length
-                if nlen > 0.00001:
-                    hvec *= hlen / nlen
-                    h2A[0] = hvec[0] + ptA[0]
-                    h2A[1] = hvec[1] + ptA[1]
-                    h1A[0] = ptA[0] - hvec[0]
-                    h1A[1] = ptA[1] - hvec[1]
-
-            if htN == 'AUTO':
-                hlen = (h1N - ptN).length
-                hvec = data[-2][3].copy()
-                if hvec[0] > ptN[0]:
-                    hvec[0] = ptN[0]
-
-                hvec -= ptN
-                nlen = hvec.length
-                if nlen > 0.00001:
-                    hvec *= hlen / nlen
-                    h1N[0] = hvec[0] + ptN[0]
-                    h1N[1] = hvec[1] + ptN[1]
-                    h2N[0] = ptN[0] - hvec[0]
-                    h2N[1] = ptN[1] - hvec[1]
-
-        if not extrapolate:
-            pt = data[0]
-            co = pt[0]
-            hl = pt[2]
-            hl[0] = 0.0
-            hl[1] = co[1]
+            co[..., 1] = a + co[..., 1] * (b - a)
 
-            pt = data[-1]
-            co = pt[0]
-            hr = pt[3]
-            hr[0] = 1.0
-            hr[1] = co[1]
+        h1, h2 = bezier_handles(co, handle_types)
 
-        for index, item in enumerate(data):
-            data[index] = KeyframePoint(co=item[0], handle_left=item[2], handle_right=item[3])
+        if not extrapolate:
+            h1[0, 0] = (0.0, co[0, 0, 1])
+            h2[0, -1] = (1.0, co[0, -1, 1])
 
-        return data
+        return [KeyframePoint(co=tuple(pt), handle_left=tuple(hl), handle_right=tuple(hr))
+                for pt, hl, hr in zip(co[0].tolist(), h1[0].tolist(), h2[0].tolist())]
 
 
 def curve_component_interpolation_update(component: 'CurveComponent', _=None) -> None:
@@ -535,15 +409,13 @@ class CurveComponent(Component, PropertyGroup):
     def __init__(self, **properties: Dict[str, Any]) -> None:
         super().__init__(**properties)
         self.points.__init__(curve_component_preset_get(self))
-        self.system.curve_mapping_manager.node_set(self.name, self)
 
     def __onfileload__(self) -> None:
-        node = self.system.curve_mapping.node_get(self.name)
-        if node is None:
-            self.system.curve_mapping.node_set(self.name, self)
+        # The mapping node is created when the editor is drawn
+        pass
 
     def __ondisposed__(self) -> None:
-        self.system.curve_mapping.node_remove(self.name)
+        self.system.curve_mapping_manager.node_remove(self.name)
 
     def __onsymmetry__(self, symtarget: 'Component') -> None:
         symtarget["interpolation"] = INTERPOLATION_ENUM_INDEX[self.interpolation]
@@ -554,7 +426,7 @@ class CurveComponent(Component, PropertyGroup):
 
     def draw(self, layout: 'UILayout', label: Optional[str]=None) -> None:
         manager = self.system.curve_mapping_manager
-        node = manager.node_get(self.name)
+        node = manager.node_ensure(self)
 
         outer = layout.row()
         split = outer.split(factor=0.385)
@@ -571,8 +443,7 @@ class CurveComponent(Component, PropertyGroup):
         row.separator(factor=2.0)
 
         if node is None:
-            box.label(icon='ERROR', text="Missing Curve")
-            box.operator("asks.curve_reload", text="Reload")
+            box.label(icon='TIME', text="Loading Curve")
             return
 
         row = box.row()
@@ -619,7 +490,7 @@ class CurveComponent(Component, PropertyGroup):
         col.separator(factor=0.3)
 
     def process(self) -> None:
-        self.system.curve_mapping_manager.node_set(self.name, self)
+        self.system.curve_mapping_manager.node_update(self.name, self)
         super().process()
 
     def update(self) -> None:
@@ -1,11 +1,14 @@
 
 
-from typing import Optional, Protocol, TYPE_CHECKING, Sequence, Set, Tuple
+from typing import Dict, Optional, Protocol, TYPE_CHECKING, Sequence, Set, Tuple
+import numpy as np
 import bpy
+from bpy.app.handlers import persistent
 from bpy.types import Operator, PropertyGroup
+from ..asks.curves import points_changed
 from .curve_component import HANDLE_TYPE_ENUM_ITEMS, EXTEND_ENUM_INDEX, CurveComponent
 if TYPE_CHECKING:
-    from bpy.types import CurveMapping, ShaderNodeTree, ShaderNodeVectorCurve
+    from bpy.types import CurveMapping, Depsgraph, ShaderNodeTree, ShaderNodeVectorCurve
 
 
 class CurvePointProtocol(Protocol):
@@ -19,7 +22,20 @@ class CurveProtocol(Protocol):
     points: Sequence[CurvePointProtocol]
 
 
-_editing = set()
+# Components shown in the UI, mapped by name to the key's name, the component's
+# path and the fingerprint of its mapping when it was last synced. Components
+# are resolved again on every update as collection items can be reallocated.
+_editing: Dict[str, Tuple[str, str, Optional[int]]] = {}
+
+
+def _component_resolve(name: str, path: str) -> Optional[CurveComponent]:
+    key = bpy.data.shape_keys.get(name)
+    try:
+        component = key.path_resolve(path) if key else None
+    except ValueError:
+        return None
+    return component if isinstance(component, CurveComponent) else None
+
 
 def _differ(component: CurveComponent, mapping: 'CurveMapping') -> bool:
     if component.extend != mapping.extend:
@@ -41,20 +57,78 @@ def _differ(component: CurveComponent, mapping: 'CurveMapping') -> bool:
         return False
 
 
-def _check_for_updates() -> None:
-    for curve in _editing:
-        tree = CurveMappingManager.node_tree_get()
-        if tree is not None:
-            node = tree.nodes.get(curve.name)
-            if node is not None:
-                mapping = node.mapping
-                if _differ(curve, mapping):
-                    curve["extend"] = EXTEND_ENUM_INDEX[mapping.extend]
-                    curve.points.__init__(mapping.curves[0].points)
-                    curve.update()
+def _fingerprint(mapping: 'CurveMapping') -> int:
+    points = mapping.curves[0].points
+    count = len(points)
+    co = np.empty(count * 2, dtype=np.float32)
+    handle_types = np.empty(count, dtype=np.int32)
+    points.foreach_get("location", co)
+    points.foreach_get("handle_type", handle_types)
+    return hash((mapping.extend, co.tobytes(), handle_types.tobytes()))
+
+
+@persistent
+def _editing_clear(_) -> None:
+    # Components are invalidated by undo and file loads
     _editing.clear()
 
 
+@persistent
+def _check_for_updates(_, depsgraph: 'Depsgraph') -> None:
+    if not _editing or not depsgraph.id_type_updated('NODETREE'):
+        return
+    tree = CurveMappingManager.node_tree_get()
+    if tree is None:
+        return
+    for name, (key_name, path, fingerprint) in tuple(_editing.items()):
+        curve = _component_resolve(key_name, path)
+        if curve is None or curve.name != name:
+            del _editing[name]
+            continue
+        node = tree.nodes.get(name)
+        if node is not None:
+            mapping = node.mapping
+            value = _fingerprint(mapping)
+            if value != fingerprint:
+                _editing[name] = (key_name, path, value)
+                curve["extend"] = EXTEND_ENUM_INDEX[mapping.extend]
+                curve.points.__init__(mapping.curves[0].points)
+                curve.update()
+
+
+# Mapping nodes are created when an editor is drawn and removed before the file
+# is saved if no editor has drawn them since the last save. They are not
+# collected periodically as an open popover may show a node without drawing it.
+
+# Components waiting for a node, mapped by name to the key's name and the
+# component's path.
+_requested: Dict[str, Tuple[str, str]] = {}
+_drawn: Set[str] = set()
+
+
+def _requested_nodes_add() -> None:
+    for name, (key_name, path) in tuple(_requested.items()):
+        component = _component_resolve(key_name, path)
+        if component is not None and component.name == name:
+            component.system.curve_mapping_manager.node_set(name, component)
+    _requested.clear()
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'PROPERTIES':
+                area.tag_redraw()
+
+
+@persistent
+def _nodes_collect(_) -> None:
+    tree = CurveMappingManager.node_tree_get()
+    if tree is None:
+        return
+    keep = _drawn.union(_editing)
+    _drawn.clear()
+    for node in [node for node in tree.nodes if node.name not in keep]:
+        tree.nodes.remove(node)
+
+
 class ASKS_OT_curve_reload(Operator):
 
     bl_idname = "asks.curve_reload"
@@ -137,9 +211,16 @@ class CurveMappingManager(PropertyGroup):
 
     @staticmethod
     def enable_editor(component: CurveComponent) -> None:
-        _editing.add(component)
-        if not bpy.app.timers.is_registered(_check_for_updates):
-            bpy.app.timers.register(_check_for_updates, first_interval=1.0)
+        name = component.name
+        item = (component.id_data.name, component.path_from_id())
+        entry = _editing.get(name)
+        if entry is None:
+            tree = CurveMappingManager.node_tree_get()
+            node = tree.nodes.get(name) if tree else None
+            mapping = node.mapping if node else None
+            _editing[name] = item + (None if mapping is None or _differ(component, mapping) else _fingerprint(mapping),)
+        elif entry[:2] != item:
+            _editing[name] = item + entry[2:]
 
     @staticmethod
     def node_tree_get(ensure: Optional[bool]=False) -> Optional['ShaderNodeTree']:
@@ -154,6 +235,23 @@ class CurveMappingManager(PropertyGroup):
         if tree is not None:
             return tree.nodes.get(name)
 
+    def node_ensure(self, component: CurveComponent) -> Optional['ShaderNodeVectorCurve']:
+        # Nodes can not be added while drawing, so a missing node is added by a
+        # timer and the editor drawn again.
+        name = component.name
+        node = self.node_get(name)
+        if node is None:
+            _requested[name] = (component.id_data.name, component.path_from_id())
+            if not bpy.app.timers.is_registered(_requested_nodes_add):
+                bpy.app.timers.register(_requested_nodes_add, first_interval=0.0)
+        else:
+            _drawn.add(name)
+        return node
+
+    def node_update(self, name: str, data: CurveProtocol) -> None:
+        if self.node_get(name) is not None:
+            self.node_set(name, data)
+
     def node_set(self, name: str, data: CurveProtocol) -> None:
         tree = self.node_tree_get(True)
         node = tree.nodes.get(name)
@@ -173,10 +271,13 @@ class CurveMappingManager(PropertyGroup):
         length = max(len(data.points), 2)
         points = mapping.curves[0].points
 
-        while len(points) > length: points.remove(points[-2])
+        while len(points) > length: points.remove(points[-1])
         while len(points) < length: points.new(0.0, 0.0)
 
-        for point, props in zip(points, data.points):
+        # Only the points that differ are written
+        for index in points_changed(points, data.points):
+            point = points[index]
+            props = data.points[index]
             point.handle_type = props.handle_type
             point.location = props.location
             point.select = props.select
@@ -189,3 +290,26 @@ class CurveMappingManager(PropertyGroup):
             node = tree.nodes.get(name)
             if node is not None:
                 tree.nodes.remove(node)
+
+
+def register() -> None:
+    from bpy.app.handlers import depsgraph_update_post, load_pre, redo_post, save_pre, undo_post
+    depsgraph_update_post.append(_check_for_updates)
+    load_pre.append(_editing_clear)
+    undo_post.append(_editing_clear)
+    redo_post.append(_editing_clear)
+    save_pre.append(_nodes_collect)
+
+
+def unregister() -> None:
+    from bpy.app.handlers import depsgraph_update_post, load_pre, redo_post, save_pre, undo_post
+    depsgraph_update_post.remove(_check_for_updates)
+    load_pre.remove(_editing_clear)
+    undo_post.remove(_editing_clear)
+    redo_post.remove(_editing_clear)
+    save_pre.remove(_nodes_collect)
+    if bpy.app.timers.is_registered(_requested_nodes_add):
+        bpy.app.timers.unregister(_requested_nodes_add)
+    _editing.clear()
+    _requested.clear()
+    _drawn.clear()
@@ -414,7 +414,8 @@ class namespace:
             from .types.curve_mapping_manager import (ASKS_OT_curve_point_handle_type_set,
                                                     ASKS_OT_curve_point_remove,
                                                     ASKS_OT_curve_reload,
-                                                    CurveMappingManager)
+                                                    CurveMappingManager,
+                                                    register as curve_mapping_register)
             from .types.entity_components import EntityComponents
             from .types.entity import Entity
             from .types.entity_settings_panel import EntitySettingsPanel
@@ -462,6 +463,7 @@ class namespace:
 
             System.log = getLogger("asks")
             load_post.append(_on_file_load)
+            curve_mapping_register()
             MESH_MT_shape_key_context_menu.append(_draw_menu_items)
 
         return super(namespace, cls).__new__(cls)
@@ -580,4 +582,6 @@ class namespace:
             # with suppress(ValueError): unregister_class(cls)
 
             load_post.remove(_on_file_load)
+            from .types.curve_mapping_manager import unregister as curve_mapping_unregister
+            curve_mapping_unregister()
             MESH_MT_shape_key_context_menu.remove(_draw_menu_items)